@@ -97,3 +97,35 @@ USE_TZ = True
 
 
 ASGI_APPLICATION = 'MultiBingo.asgi.application'
+
+
+# Keep the state of each active game in the memory of the server process, rather than reading and
+#  writing the database for every websocket action. Changes are written back to the database in
+#  batches every GAME_FLUSH_INTERVAL seconds, and when the process exits. Changes since the last
+#  flush are lost if the process is killed without a chance to exit.
+# Only enable this if a single server process handles every websocket connection.
+KEEP_GAMES_IN_MEMORY = False
+GAME_FLUSH_INTERVAL = 0.5
+
+# Board and pboards broadcasts to a game are merged if they are requested within
+#  BROADCAST_COALESCE_WINDOW seconds of each other, delaying them by at most
+#  BROADCAST_COALESCE_MAX_DELAY seconds. Set the window to 0 to send every broadcast immediately.
+BROADCAST_COALESCE_WINDOW = 0.03
+BROADCAST_COALESCE_MAX_DELAY = 0.1
+
+# Number of boards of each shape and win detector to generate ahead of time, so that new games can
+#  start without waiting for a board to be generated. Set to 0 to generate every board on demand.
+BOARD_POOL_SIZE = 3
+
+# Store the markings of new player boards packed into a single column of the player board, rather
+#  than as a row for each space. Existing player boards keep the storage they were created with.
+PACK_PLAYER_BOARD_MARKINGS = False
+
+# Seconds that a disconnected plugin's automarks are kept, in case it reconnects with the same client
+#  ID (such as when its Minecraft server restarts). Set to 0 to clear them as soon as it disconnects.
+AUTOMARK_GRACE_PERIOD = 30
+
+# Directory of the tables that hexagon boards are checked for wins with, which are built by the
+#  buildwintables command and shared by every server process. Wins are searched for instead while
+#  the tables have not been built.
+WIN_TABLE_DIR = BASE_DIR / 'win_tables'
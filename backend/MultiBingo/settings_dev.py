@@ -21,6 +21,10 @@ DATABASES = {
     }
 }
 
+# SQLite only allows one write at a time, so filling the board pool in the background can cause
+#  other writes to fail with "database is locked"
+BOARD_POOL_SIZE = 0
+
 
 CHANNEL_LAYERS = {
     'default': {
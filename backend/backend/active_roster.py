@@ -0,0 +1,122 @@
+"""
+Which players are on the roster of a game, which is the list of player boards shown to everyone:
+those of players who are connected, or who disconnected less than `DISCONNECTED_TIMEOUT` ago.
+
+Rather than being worked out from `PlayerBoard.disconnected_at` on every render, the roster of a
+game kept in memory is kept up to date as players connect and disconnect, and by a sweeper that
+drops players once they have been disconnected for too long and announces it with one broadcast.
+Other games are shared between processes, so they filter on `PlayerBoard.disconnected_at` instead.
+"""
+import asyncio
+import traceback
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from django.utils import timezone
+
+from backend.models.player_board import PlayerBoard
+
+DISCONNECTED_TIMEOUT = timedelta(minutes=1)
+"""
+How long a disconnected player's board continues to be shown to everyone else.
+"""
+
+SWEEP_SLACK = timedelta(seconds=1)
+"""
+Players who are due to be dropped within this long of each other are dropped together, so that
+players who disconnected around the same time are announced with one broadcast.
+"""
+
+
+class ActiveRoster:
+    def __init__(self, board_id: int, player_boards: Iterable[PlayerBoard]):
+        self.board_id = board_id
+        self.dropped = set()  # type: Set[int]
+        """IDs of the player boards that are not shown, since they disconnected too long ago."""
+        self.disconnected = {}  # type: Dict[int, datetime]
+        """Times that the disconnected players who are still shown disconnected, by player board ID."""
+
+        self._sweeper = None  # type: Optional[asyncio.Future]
+        self._on_drop = None  # type: Optional[Callable[[], Awaitable]]
+        self._unannounced = False
+
+        dropped_before = timezone.now() - DISCONNECTED_TIMEOUT
+        for pboard in player_boards:
+            if pboard.disconnected_at is None:
+                continue
+            if pboard.disconnected_at <= dropped_before:
+                self.dropped.add(pboard.pk)
+            else:
+                self.disconnected[pboard.pk] = pboard.disconnected_at
+
+    def dropped_ids(self) -> Set[int]:
+        """
+        Get the IDs of the player boards that are not shown. Players who are due to be dropped are
+        dropped here too, in case there is no sweeper running for them, such as when they
+        disconnected before this roster was loaded from the database.
+        """
+        self._drop_due(timezone.now() - DISCONNECTED_TIMEOUT)
+        return set(self.dropped)
+
+    def connect(self, player_board_id: int) -> bool:
+        """
+        :return: True if connecting brought the player back onto the roster, since they had been
+                 disconnected for too long.
+        """
+        self.disconnected.pop(player_board_id, None)
+        if player_board_id in self.dropped:
+            self.dropped.discard(player_board_id)
+            return True
+        return False
+
+    def disconnect(self, player_board_id: int, on_drop: Callable[[], Awaitable]):
+        """
+        Drop a player from the roster once they have been disconnected for `DISCONNECTED_TIMEOUT`,
+        unless they connect again first.
+        :param on_drop: Coroutine function that announces that players were dropped. If several
+                        players are dropped at once, the one passed with the last disconnect is
+                        called once for all of them.
+        """
+        self.disconnected[player_board_id] = timezone.now()
+        self._on_drop = on_drop
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.ensure_future(self._sweep())
+
+    def stop(self):
+        """
+        Stop dropping players, such as when the game is unloaded from memory.
+        """
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+
+    def _drop_due(self, dropped_before: datetime):
+        for player_board_id, disconnected_at in list(self.disconnected.items()):
+            if disconnected_at <= dropped_before:
+                del self.disconnected[player_board_id]
+                self.dropped.add(player_board_id)
+                self._unannounced = True
+
+    async def _sweep(self):
+        while self.disconnected:
+            drop_at = min(self.disconnected.values()) + DISCONNECTED_TIMEOUT
+            delay = (drop_at - timezone.now()).total_seconds()
+            if delay > 0:
+                # Players may connect again or disconnect meanwhile, so check again after
+                await asyncio.sleep(delay)
+                continue
+
+            self._drop_due(timezone.now() - DISCONNECTED_TIMEOUT + SWEEP_SLACK)
+            await self._announce()
+
+        # Players may also have been dropped by `dropped_ids` while this was waiting
+        await self._announce()
+
+    async def _announce(self):
+        if not self._unannounced:
+            return
+        self._unannounced = False
+        try:
+            await self._on_drop()
+        except Exception:
+            print(f"Failed to announce players dropped from board ID {self.board_id}:")
+            traceback.print_exc()
@@ -0,0 +1,54 @@
+"""
+Keeps a disconnected plugin's automarks for `AUTOMARK_GRACE_PERIOD` seconds, so that a plugin that
+reconnects soon after (such as when its Minecraft server restarts) does not cause every space it
+auto-marks to be cleared and then set again, with a board broadcast each time.
+
+Only a plugin that reconnects to the same process is noticed. Otherwise, its automarks are cleared
+once the grace period ends, and set again the next time it sends them.
+"""
+import asyncio
+import traceback
+from typing import Awaitable, Callable, Dict, Tuple
+
+from django.conf import settings
+
+_PENDING: Dict[Tuple[int, str], Tuple[asyncio.Future, Callable[[], None]]] = {}
+
+
+def clear_later(board_id: int, client_id: str, clear: Callable[[], Awaitable],
+                release: Callable[[], None]):
+    """
+    Clear a disconnected plugin's automarks once the grace period ends, unless it reconnects first.
+    :param clear: Coroutine function that clears the automarks.
+    :param release: Function that is called instead of `clear` if the plugin reconnects first, to
+                    let go of anything that was kept for it during the grace period.
+    """
+    key = (board_id, client_id)
+    reconnected(board_id, client_id)
+    _PENDING[key] = (asyncio.ensure_future(_clear_after_grace(key, clear)), release)
+
+
+def reconnected(board_id: int, client_id: str) -> bool:
+    """
+    Keep the automarks of a plugin that has reconnected.
+    :return: True if the plugin was in its grace period.
+    """
+    pending = _PENDING.pop((board_id, client_id), None)
+    if pending is None:
+        return False
+
+    task, release = pending
+    task.cancel()
+    release()
+    return True
+
+
+async def _clear_after_grace(key: Tuple[int, str], clear: Callable[[], Awaitable]):
+    await asyncio.sleep(settings.AUTOMARK_GRACE_PERIOD)
+
+    del _PENDING[key]
+    try:
+        await clear()
+    except Exception:
+        print(f"Failed to clear automarks of {{{key[1]}}} in board ID {key[0]}:")
+        traceback.print_exc()
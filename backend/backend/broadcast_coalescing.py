@@ -0,0 +1,74 @@
+"""
+Merges broadcasts of the same kind to the same game that are requested close together, so that a
+burst of changes (such as everyone joining when a game starts) causes one render and one group
+message instead of one for every change.
+
+A broadcast is sent once no further request for it has arrived for `BROADCAST_COALESCE_WINDOW`
+seconds, but never later than `BROADCAST_COALESCE_MAX_DELAY` seconds after it was first requested.
+Only use this for messages that carry the complete current state, since all but the last request
+are dropped.
+"""
+import asyncio
+import traceback
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+_PENDING: Dict[Tuple[str, str], '_PendingBroadcast'] = {}
+
+
+class _PendingBroadcast:
+    def __init__(self, send: Callable[[], Awaitable]):
+        loop = asyncio.get_running_loop()
+        self.send = send
+        self.first_requested = loop.time()
+        self.last_requested = self.first_requested
+        self.task = None  # type: Optional[asyncio.Future]
+
+
+async def coalesce(game_code: str, kind: str, send: Callable[[], Awaitable]):
+    """
+    Request that a broadcast be sent soon.
+    :param kind: Broadcasts of the same kind to the same game are merged.
+    :param send: Coroutine function that sends the broadcast. When requests are merged, the one
+                 passed with the last request is used.
+    """
+    if settings.BROADCAST_COALESCE_WINDOW <= 0:
+        await send()
+        return
+
+    key = (game_code, kind)
+    pending = _PENDING.get(key)
+    if pending:
+        pending.send = send
+        pending.last_requested = asyncio.get_running_loop().time()
+    else:
+        pending = _PendingBroadcast(send)
+        _PENDING[key] = pending
+        pending.task = asyncio.ensure_future(_send_when_quiet(key))
+
+
+def is_pending(game_code: str, kind: str) -> bool:
+    """
+    :return: True if a broadcast has been requested and not sent yet.
+    """
+    return (game_code, kind) in _PENDING
+
+
+async def _send_when_quiet(key: Tuple[str, str]):
+    loop = asyncio.get_running_loop()
+    pending = _PENDING[key]
+    while True:
+        send_at = min(pending.last_requested + settings.BROADCAST_COALESCE_WINDOW,
+                      pending.first_requested + settings.BROADCAST_COALESCE_MAX_DELAY)
+        if loop.time() >= send_at:
+            break
+        await asyncio.sleep(send_at - loop.time())
+
+    # Requests from here on need another broadcast, since this one may already be rendered
+    del _PENDING[key]
+    try:
+        await pending.send()
+    except Exception:
+        print(f"Failed to send {key[1]} broadcast to game {key[0]}:")
+        traceback.print_exc()
@@ -1,25 +1,43 @@
+import asyncio
 import json
+import traceback
 from abc import ABC, abstractmethod
 from random import randrange
-from typing import Set, Dict
+from typing import Set, Dict, Optional, List, Tuple
+from urllib.parse import parse_qs
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
+from backend import automark_grace, event_log, roster_batching
+from backend.active_roster import DISCONNECTED_TIMEOUT, SWEEP_SLACK
+from backend.broadcast_coalescing import coalesce, is_pending
+from backend.live_game import LiveGame, get_live_game
 from backend.log_consumer_exceptions import log_consumer_exceptions
-from backend.models import Color, Space
+from backend.models import Space
+from backend.models.auto_mark import AutoMark
 from backend.models.board import Board
-from backend.models.player_board import PlayerBoard
+from backend.models.player_board import PlayerBoard, clear_auto_markers, \
+    get_or_create_player_boards, set_auto_markers
 from backend.models.player_board_marking import PlayerBoardMarking
 from backend.serializers.board_player import BoardPlayerSerializer
 from backend.serializers.board_plugin import BoardPluginSerializer
+from backend.serializers.game_state import marking_announcement
 from backend.serializers.message_relay import MessageRelaySerializer
 from backend.serializers.player_board import PlayerBoardSerializer
-from generation.board_generator import generate_board
-from generation.goals import ConcreteGoal
+from generation.board_pool import claim_or_generate_board
 from win_detection.win_detection import winning_space_ids
 
+# Roles of consumers in a game. Each role has its own channel group, so that messages only reach
+#  the kind of consumer that needs them.
+PLAYERS = 'players'
+SPECTATORS = 'spectators'
+PLUGINS = 'plugins'
+ALL_ROLES = [PLAYERS, SPECTATORS, PLUGINS]
+
 
 @log_consumer_exceptions
 class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
@@ -29,26 +47,45 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
         self.game_code = None
         self.client_id = None  # Player Name if a player; unique ID if otherwise
         self.board_id = None
+        self.role = None  # One of the roles above
+
+        # Only set if the KEEP_GAMES_IN_MEMORY setting is enabled
+        self.live_game = None  # type: Optional[LiveGame]
+
+        # Latest board version sent to this client, and the version it last saw before
+        #  reconnecting (if it is resuming)
+        self.version = None  # type: Optional[int]
+        self.resume_version = None  # type: Optional[int]
 
         # Optional - only set if this is representative of a single Player and not a Spectator
         self.player_board_id = None  # Remains None if this represents a Spectator
 
     async def connect(self):
-        self.game_code = self.scope['url_route']['kwargs']['game_code']
+        self.read_url()
 
         self.board_id = await get_board_id(self.game_code)
         if not self.board_id:
             print(f"Error getting board: {self.game_code} (client: {self.client_id})")
             return  # reject connection
 
-        await self.channel_layer.group_add(self.game_code, self.channel_name)
+        if settings.KEEP_GAMES_IN_MEMORY:
+            self.live_game = await get_live_game(self.board_id)
+            self.live_game.join(self.channel_name, self.client_id)
+
+        await self.channel_layer.group_add(self.group_name(), self.channel_name)
         await self.accept()
         await self.send_board_to_ws()
-        await self.send_pboards_all_consumers()
+
+    def read_url(self):
+        self.game_code = self.scope['url_route']['kwargs']['game_code']
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        if query.get('version', [''])[0].isdigit():
+            self.resume_version = int(query['version'][0])
 
     async def receive(self, text_data: str = None, **kwargs):
         broadcast_board = False
         broadcast_pboards = False
+        pboard_patch = None
         text_data_json = json.loads(text_data)
         action = text_data_json.get('action')
 
@@ -56,17 +93,29 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
             print(f"WebSocket {self.client_id} attempted disallowed action {{{action}}}")
             return
 
+        if action == 'ping':
+            await self.send_pong_to_ws()
+            return
+
         if action == 'board_mark' and self.player_board_id:
             space_id = int(text_data_json['space_id'])
             to_state = text_data_json.get('to_state')
             covert_marked = text_data_json.get('covert_marked')
-            broadcast_pboards = await self.rx_mark_board_player(space_id, to_state, covert_marked)
+            pboard_patch = await self.rx_mark_board_player(space_id, to_state, covert_marked)
 
         if action == 'board_mark_admin':
             space_id = int(text_data_json['space_id'])
             to_state = int(text_data_json['to_state'])
             player_name = text_data_json['player']
-            broadcast_pboards = await self.rx_mark_board_admin(space_id, to_state, player_name)
+            changed, pboard_patch = await self.rx_mark_board_admin(space_id, to_state, player_name)
+            if changed and not pboard_patch:
+                # Player board was newly created, so there is nothing to patch
+                broadcast_pboards = True
+
+        if action == 'board_mark_admin_batch':
+            marks = [(m['player'], int(m['space_id']), int(m['to_state']))
+                     for m in text_data_json['marks']]
+            broadcast_pboards = await self.rx_mark_board_admin_batch(marks)
 
         if action == 'game_state':
             to_state = text_data_json['to_state']
@@ -80,9 +129,12 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
 
         if action == 'set_automarks':
             space_ids = text_data_json['space_ids']
-            changed = await self.rx_set_automarks(space_ids)
+            changed, created = await self.rx_set_automarks(space_ids)
             if changed:
                 broadcast_board = True
+            if created:
+                # New players joined the roster, which changed the board's version
+                broadcast_pboards = True
 
         if action == 'message_relay':
             content_mc_tellraw = text_data_json.get('json')
@@ -91,6 +143,8 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
                 'json': content_mc_tellraw,
             })
             await self.send_message_relay_all_consumers(msg.data)
+            # Relayed messages are only for other plugins and never change the game
+            return
 
         if action == 'plugin_parity':
             my_settings = text_data_json.get('my_settings')
@@ -100,44 +154,105 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
                 'is_echo': is_echo,
                 'settings': my_settings,
             })
+            return
 
         if broadcast_board:
             await self.send_board_all_consumers()
 
         if broadcast_pboards:
             await self.send_pboards_all_consumers()
+        elif pboard_patch:
+            await self.send_pboard_patch_all_consumers(pboard_patch)
         else:
-            # only send to the client that sent this message (i.e. for a ping)
+            # only send to the client that sent this message (i.e. for `sync_pboards`, sent by
+            #  clients that missed a patch)
             await self.send_pboards_to_ws()
 
     async def disconnect(self, code):
-        # Clear all automarkings since this client is no longer connected
-        had_automarks = await set_automarks(self.board_id, self.client_id, {})
-        if had_automarks:
-            await self.send_board_all_consumers()
-
         await self.channel_layer.group_discard(
-            self.game_code,
+            self.group_name(),
             self.channel_name
         )
 
+    def group_name(self, role: str = None):
+        return f'{self.game_code}.{role or self.role}'
+
+    async def group_send(self, roles: List[str], event: dict):
+        for role in roles:
+            await self.channel_layer.group_send(self.group_name(role), event)
+
+    async def send_pboards_on_connect(self, roster_changed: bool):
+        """
+        Bring a newly connected client's player boards up to date. Everyone else only needs an
+        update if this connection changed the roster of players.
+        """
+        if roster_changed:
+            await self.send_pboards_all_consumers()
+            return
+
+        replayed = await self.replay_pboard_patches()
+        if not replayed:
+            await self.send_pboards_to_ws()
+
+    async def replay_pboard_patches(self):
+        """
+        Send a reconnecting client only the patches it missed while it was disconnected.
+        :return: True if successful, or False if the client needs a full update instead.
+        """
+        if self.resume_version is None:
+            return False
+
+        if self.live_game:
+            current_version = self.live_game.board.version
+        else:
+            current_version = await get_board_version(self.board_id)
+
+        patches = event_log.replay(self.board_id, self.resume_version, current_version)
+        if patches is None:
+            return False
+
+        for patch in patches:
+            await self.send_pboard_patch_to_ws({'pboard_patch': patch})
+        self.version = current_version
+        return True
+
     async def rx_mark_board_player(self, space_id, to_state: int = None, covert_marked: int = None):
-        changed, game_state_msg, winner = await mark_space_player(
-            self.player_board_id, space_id, to_state, covert_marked)
-        await mark_disconnected(self.player_board_id, False)
+        if self.live_game:
+            changed, pboard_patch, game_state_msg, winner = await self.live_game.mark_space_player(
+                self.player_board_id, space_id, to_state, covert_marked)
+            await self.live_game.mark_disconnected(self.player_board_id, False)
+        else:
+            changed, pboard_patch, game_state_msg, winner = await mark_space_player(
+                self.player_board_id, space_id, to_state, covert_marked)
+            await mark_disconnected(self.player_board_id, False)
         if game_state_msg is not None:
             await self.send_game_state_all_consumers(game_state_msg)
         if winner:
             await self.send_game_state_all_consumers({'state': 'end', 'winner': winner})
-        return changed
+        return pboard_patch
 
     async def rx_mark_board_admin(self, space_id, to_state, player):
-        changed, game_state_msg, winner = await mark_space_admin(
-            self.board_id, player, space_id, to_state)
+        if self.live_game:
+            changed, pboard_patch, game_state_msg, winner = await self.live_game.mark_space_admin(
+                player, space_id, to_state)
+        else:
+            changed, pboard_patch, game_state_msg, winner = await mark_space_admin(
+                self.board_id, player, space_id, to_state)
         if game_state_msg is not None:
             await self.send_game_state_all_consumers(game_state_msg)
         if winner:
             await self.send_game_state_all_consumers({'state': 'end', 'winner': winner})
+        return changed, pboard_patch
+
+    async def rx_mark_board_admin_batch(self, marks):
+        if self.live_game:
+            changed, announcements, winner = await self.live_game.mark_spaces_admin(marks)
+        else:
+            changed, announcements, winner = await mark_spaces_admin(self.board_id, marks)
+        for game_state_msg in announcements:
+            await self.send_game_state_all_consumers(game_state_msg)
+        if winner:
+            await self.send_game_state_all_consumers({'state': 'end', 'winner': winner})
         return changed
 
     async def rx_game_state(self, to_state):
@@ -146,16 +261,24 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
             await self.send_game_state_all_consumers({'state': to_state})
 
     async def rx_reveal_board(self):
+        if self.live_game:
+            return await self.live_game.reveal_board()
         changed = await reveal_board(self.board_id)
         return changed
 
     async def rx_set_automarks(self, space_ids):
-        changed = await set_automarks(self.board_id, self.client_id, space_ids)
-        return changed
+        if self.live_game:
+            return await self.live_game.set_automarks(self.client_id, space_ids)
+        changed, created = await set_automarks(self.board_id, self.client_id, space_ids)
+        return changed, created
 
     async def send_board_all_consumers(self):
-        await self.channel_layer.group_send(
-            self.game_code, {
+        await coalesce(self.game_code, 'board', self.send_board_all_consumers_now)
+
+    async def send_board_all_consumers_now(self):
+        # Boards for plugins do not change after the game is generated
+        await self.group_send(
+            [PLAYERS, SPECTATORS], {
                 'type': 'send_board_to_ws'
             }
         )
@@ -166,21 +289,79 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
         ...
 
     async def send_pboards_all_consumers(self):
-        await self.channel_layer.group_send(
-            self.game_code, {
-                'type': 'send_pboards_to_ws'
+        await coalesce(self.game_code, 'pboards', self.send_pboards_all_consumers_now)
+
+    async def send_pboards_all_consumers_now(self):
+        # Render once here rather than in each consumer that receives the group message
+        pboards = await self.render_pboards()
+        await self.group_send(
+            ALL_ROLES, {
+                'type': 'send_pboards_to_ws',
+                'pboards': pboards,
             }
         )
 
     async def send_pboards_to_ws(self, event=None):
-        board_states = await database_sync_to_async(PlayerBoardSerializer.from_board_id)(
-            self.board_id, self.player_board_id
+        if event is not None:
+            pboards = event['pboards']
+        else:
+            pboards = await self.render_pboards()
+        self.version = pboards['version']
+        event_log.record_snapshot(self.board_id, self.version)
+        await self.send(text_data=PlayerBoardSerializer.text_for_recipient(
+            pboards, self.player_board_id
+        ))
+
+    async def render_pboards(self):
+        if self.live_game:
+            return self.live_game.render_pboards()
+        return await database_sync_to_async(PlayerBoardSerializer.render_shared)(self.board_id)
+
+    async def send_pboard_patch_all_consumers(self, pboard_patch):
+        if is_pending(self.game_code, 'pboards'):
+            # Will be rendered into the upcoming pboards broadcast
+            return
+        await self.group_send(
+            [PLAYERS, SPECTATORS], {
+                'type': 'send_pboard_patch_to_ws',
+                'pboard_patch': pboard_patch,
+            }
+        )
+        # Plugins do not understand patches, so they still get every change as full pboards
+        await coalesce(self.game_code, 'plugin_pboards', self.send_pboards_plugins_now)
+
+    async def send_pboards_plugins_now(self):
+        if is_pending(self.game_code, 'pboards'):
+            return
+        pboards = await self.render_pboards()
+        await self.group_send(
+            [PLUGINS], {
+                'type': 'send_pboards_to_ws',
+                'pboards': pboards,
+            }
         )
-        await self.send(text_data=json.dumps(board_states))
+
+    async def send_pboard_patch_to_ws(self, event=None):
+        self.version = max(self.version or 0, event['pboard_patch']['version'])
+        event_log.record_patch(self.board_id, event['pboard_patch'])
+        await self.send(text_data=PlayerBoardSerializer.text_for_recipient_patch(
+            event['pboard_patch'], self.player_board_id
+        ))
+
+    async def send_pong_to_ws(self):
+        # Answered without rendering anything. The board's current version lets the client check
+        #  whether it missed an update.
+        if self.live_game:
+            version = self.live_game.board.version
+        else:
+            version = await get_board_version(self.board_id)
+        await self.send(text_data=json.dumps({
+            'pong': {'version': version}
+        }))
 
     async def send_game_state_all_consumers(self, game_state):
-        await self.channel_layer.group_send(
-            self.game_code, {
+        await self.group_send(
+            ALL_ROLES, {
                 'type': 'send_game_state_to_ws',
                 'game_state': game_state,
             }
@@ -192,8 +373,8 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
         }))
 
     async def send_message_relay_all_consumers(self, message):
-        await self.channel_layer.group_send(
-            self.game_code, {
+        await self.group_send(
+            [PLUGINS], {
                 'type': 'send_message_relay_to_ws',
                 'message': message,
             }
@@ -205,8 +386,8 @@ class BaseWebConsumer(AsyncJsonWebsocketConsumer, ABC):
         }))
 
     async def send_plugin_parity_all_consumers(self, message):
-        await self.channel_layer.group_send(
-            self.game_code, {
+        await self.group_send(
+            [PLUGINS], {
                 'type': 'send_plugin_parity_to_ws',
                 'message': message,
             }
@@ -225,40 +406,112 @@ class PlayerWebConsumer(BaseWebConsumer):
         self.allowed_actions = [
             'board_mark',
             'reveal_board',
+            'sync_pboards',
+            'ping',
             # 'message',
         ]
 
     async def connect(self):
-        await super().connect()
-        self.client_id = self.scope['url_route']['kwargs'].get('player_name')
+        player_name = self.scope['url_route']['kwargs'].get('player_name')
+        # If this is a spectator, give them a unique identifier.
+        self.client_id = player_name or f'[Spectator {randrange(9999)}]'
+        self.role = PLAYERS if player_name else SPECTATORS
+        if not player_name:
+            await super().connect()
+            await self.send_pboards_on_connect(roster_changed=False)
+            print(f"{self.client_id} joined game {self.game_code}.")
+            return
 
-        if self.client_id:
-            player_board_obj = (await database_sync_to_async(PlayerBoard.objects.get_or_create)(
-                board_id=self.board_id, player_name=self.client_id
-            ))[0]
+        self.read_url()
+        # Join the group before reading the game, so that no change after that read is missed
+        await self.channel_layer.group_add(self.group_name(), self.channel_name)
+
+        # A resuming client may only need patches, so only render everything for new clients
+        render_pboards = self.resume_version is None
+        if settings.KEEP_GAMES_IN_MEMORY:
+            self.board_id = await get_board_id(self.game_code)
+            self.live_game = await get_live_game(self.board_id)
+            self.live_game.join(self.channel_name, self.client_id)
+            player_board_obj, created = await self.live_game.get_or_create_player_board(
+                player_name)
             self.player_board_id = player_board_obj.pk
-            await mark_disconnected(self.player_board_id, False)
+            returned = await self.live_game.mark_disconnected(self.player_board_id, False)
+            board = self.live_game.render_board_player(self.player_board_id)
+            pboards = self.live_game.render_pboards() if render_pboards else None
+        else:
+            await roster_batching.reconnected(self.game_code, player_name)
+            self.board_id, self.player_board_id, created, returned, board, pboards = \
+                await connect_player(self.game_code, player_name, render_pboards)
 
-            # Need to send board with Auto Mark indicators now that player_board_id is set
-            await self.send_board_to_ws()
+        await self.accept()
+        if pboards is not None:
+            self.version = pboards['version']
+            event_log.record_snapshot(self.board_id, self.version)
+            await self.send(text_data=PlayerBoardSerializer.text_for_hello(
+                pboards, board, self.player_board_id
+            ))
         else:
-            # This is a spectator. Give them a unique identifier.
-            self.client_id = f'[Spectator {randrange(9999)}]'
+            await self.send(text_data=json.dumps({
+                'board': board,
+            }))
+
+        if created or returned:
+            await self.send_pboards_all_consumers()
+        elif pboards is None and not await self.replay_pboard_patches():
+            await self.send_pboards_to_ws()
 
         print(f"{self.client_id} joined game {self.game_code}.")
 
     async def disconnect(self, code):
         await super().disconnect(code)
         if self.player_board_id is not None:
-            await mark_disconnected(self.player_board_id, True)
-            await self.send_pboards_all_consumers()
+            if self.live_game:
+                await self.live_game.mark_disconnected(self.player_board_id, True)
+                self.live_game.active_roster.disconnect(self.player_board_id,
+                                                        self.announce_dropped_players)
+                await self.send_pboards_all_consumers()
+            else:
+                asyncio.ensure_future(self.announce_dropped_player_later())
+                await roster_batching.disconnected(self.game_code, self.client_id,
+                                                   self.player_board_id,
+                                                   self.send_pboards_all_consumers_now)
+
+        if self.live_game:
+            self.live_game.leave(self.channel_name)
 
         print(f"{self.client_id} disconnected from game {self.game_code}.")
 
+    async def announce_dropped_players(self):
+        """
+        Let everyone know that players have been dropped from the roster, since they have been
+        disconnected for too long.
+        """
+        self.live_game.roster_changed()
+        await self.send_pboards_all_consumers()
+
+    async def announce_dropped_player_later(self):
+        """
+        Let everyone know once this player has been dropped from the roster, unless they connect
+        again first. Games that are not kept in memory work out the roster from
+        `PlayerBoard.disconnected_at`, since other processes change it too.
+        """
+        # Wait until the player is certainly due, so that they are not announced before they drop
+        await asyncio.sleep((DISCONNECTED_TIMEOUT + SWEEP_SLACK).total_seconds())
+        try:
+            if await drop_disconnected(self.board_id, self.player_board_id):
+                await self.send_pboards_all_consumers()
+        except Exception:
+            print(f"Failed to announce that {self.client_id} was dropped from game "
+                  f"{self.game_code}:")
+            traceback.print_exc()
+
     async def send_board_to_ws(self, event=None):
-        board = await database_sync_to_async(BoardPlayerSerializer.from_id)(
-            self.board_id, self.player_board_id
-        )
+        if self.live_game:
+            board = self.live_game.render_board_player(self.player_board_id)
+        else:
+            board = await database_sync_to_async(BoardPlayerSerializer.from_id)(
+                self.board_id, self.player_board_id
+            )
         await self.send(text_data=json.dumps({
             'board': board,
         }))
@@ -270,24 +523,55 @@ class PluginBackendConsumer(BaseWebConsumer):
         super().__init__(*args, **kwargs)
         self.allowed_actions = [
             'board_mark_admin',
+            'board_mark_admin_batch',
             'game_state',
             'reveal_board',
             'set_automarks',
             'message_relay',
             'plugin_parity',
+            'sync_pboards',
+            'ping',
         ]
 
     async def connect(self):
-        await super().connect()
         self.client_id = self.scope['url_route']['kwargs'].get('client_id')
+        self.role = PLUGINS
+        await super().connect()
+        if self.board_id and automark_grace.reconnected(self.board_id, self.client_id):
+            print(f"{{{self.client_id}}} reconnected in time to keep its automarks.")
+        # Plugins are never sent patches, so they cannot resume from a version
+        await self.send_pboards_to_ws()
         print(f"{{{self.client_id}}} joined game {self.game_code}.")
 
     async def disconnect(self, code):
         await super().disconnect(code)
+        if self.board_id:
+            if settings.AUTOMARK_GRACE_PERIOD > 0:
+                # Stays on the live game's roster until then, so that the game is not unloaded
+                automark_grace.clear_later(self.board_id, self.client_id, self.clear_automarks,
+                                           self.leave_live_game)
+            else:
+                await self.clear_automarks()
         print(f"{{{self.client_id}}} disconnected from game {self.game_code}.")
 
+    async def clear_automarks(self):
+        """
+        Stop this plugin from auto-marking any space, since it is no longer connected.
+        """
+        had_automarks, _ = await self.rx_set_automarks({})
+        if had_automarks:
+            await self.send_board_all_consumers()
+        self.leave_live_game()
+
+    def leave_live_game(self):
+        if self.live_game:
+            self.live_game.leave(self.channel_name)
+
     async def send_board_to_ws(self, event=None):
-        board = await database_sync_to_async(BoardPluginSerializer.from_id)(self.board_id)
+        if self.live_game:
+            board = self.live_game.render_board_plugin()
+        else:
+            board = await database_sync_to_async(BoardPluginSerializer.from_id)(self.board_id)
         await self.send(text_data=json.dumps({
             'board': board,
         }))
@@ -295,10 +579,37 @@ class PluginBackendConsumer(BaseWebConsumer):
 
 @database_sync_to_async
 def get_board_id(game_code: str):
+    return _get_board_id(game_code)
+
+
+def _get_board_id(game_code: str):
     try:
         return Board.objects.get(game_code=game_code).pk
     except Board.DoesNotExist:
-        return generate_board(game_code).pk
+        return claim_or_generate_board(game_code).pk
+
+
+@database_sync_to_async
+@transaction.atomic
+def connect_player(game_code: str, player_name: str, render_pboards: bool):
+    """
+    Load everything a player's consumer needs when it connects, in one unit of work.
+    :param render_pboards: Whether to render every player board, rather than leaving it to the
+                           caller to bring the client up to date.
+    :return: (board_id, player_board_id, created, returned, board, pboards) - created and returned
+             indicate whether the player board was just created or brought back onto the roster
+             (see `mark_disconnected`). board is the player's own rendering of the board. pboards
+             is the output of `PlayerBoardSerializer.render_shared`, or None if not requested.
+    """
+    board_id = _get_board_id(game_code)
+    player_board_obj, created = PlayerBoard.objects.get_or_create(board_id=board_id, player_name=player_name)
+    player_board_obj.connected_at = timezone.now()
+    player_board_obj.save(update_fields=['connected_at'])
+    returned = _mark_disconnected(player_board_obj, False)
+
+    board = BoardPlayerSerializer.from_id(board_id, player_board_obj.pk)
+    pboards = PlayerBoardSerializer.render_shared(board_id) if render_pboards else None
+    return board_id, player_board_obj.pk, created, returned, board, pboards
 
 
 @database_sync_to_async
@@ -322,98 +633,222 @@ def reveal_board(board_id: str, revealed: bool = True):
 
 
 @database_sync_to_async
+@transaction.atomic
 def mark_space_player(player_board_id: int, space_id: int,
                to_state: int = None, covert_marked: bool = None):
     """
     Mark a space on a player's board.
-    :return: (changed, announcement) - changed is a bool that indicates whether the board was
-             changed with this marking. announcement is an optional object that contains the
-             announcement that should be made, if any.
+    :return: (changed, patch, announcement, winner) - changed is a bool that indicates whether the
+             board was changed with this marking. patch is the `pboard_patch` describing the
+             change, if any. announcement is an optional object that contains the announcement
+             that should be made, if any. winner is the player's name if this marking won the game.
     """
     player_board_obj = PlayerBoard.objects.select_related('board').get(pk=player_board_id)
-    changed, announce = player_board_obj.mark_space(
+    marking, announce = player_board_obj.mark_space(
         space_id, to_state, covert_marked, as_player=True)
 
-    winner = None
-    if player_board_obj.board.winner is None and winning_space_ids(player_board_obj):
-        winner = player_board_obj.player_name
-        player_board_obj.board.winner = player_board_obj
-        player_board_obj.board.save()
-
-    if announce:
-        space = Space.objects.get(pk=space_id)
-        game_state = {
-            'state': 'marking',
-            'marking_type': 'invalidate' if Color(to_state) == Color.INVALIDATED else 'complete',
-            'player': player_board_obj.player_name,
-            'goal': ConcreteGoal.from_space(space).description(),
-        }
-        return changed, game_state, winner
-    else:
-        return changed, None, winner
+    return _after_mark(player_board_obj, space_id, to_state, marking, announce)
 
 
 @database_sync_to_async
+@transaction.atomic
 def mark_space_admin(board_id: int, player_name: str, space_id: int, to_state: int):
     """
     Mark a space on a player's board.
-    :return: (changed, announce) - a pair of booleans that indicate whether the board was
-             changed and whether it should be announced.
+    :return: (changed, patch, announcement, winner) - as in `mark_space_player`, except that patch
+             is None if the player's board had to be created, since clients do not know about it
+             yet.
     """
-    player_board_obj = PlayerBoard.objects.get_or_create(board_id=board_id, player_name=player_name)[0]
-    changed, announce = player_board_obj.mark_space(space_id, to_state)
+    player_board_obj, created = PlayerBoard.objects.get_or_create(board_id=board_id, player_name=player_name)
+    marking, announce = player_board_obj.mark_space(space_id, to_state)
+
+    changed, pboard_patch, game_state, winner = _after_mark(
+        player_board_obj, space_id, to_state, marking, announce)
+    if created:
+        return True, None, game_state, winner
+    return changed, pboard_patch, game_state, winner
+
+
+def _after_mark(player_board_obj: PlayerBoard, space_id: int, to_state: int,
+                marking: Optional[PlayerBoardMarking], announce: bool):
+    """
+    Shared tail of `mark_space_player` and `mark_space_admin`: claims the win, builds the patch
+    and the announcement.
+    :param marking: The changed marking, or None if nothing changed.
+    """
+    changed = marking is not None
+    board = player_board_obj.board
+
+    win = None
+    if changed or board.winner_id is None:
+        win = winning_space_ids(player_board_obj)
 
     winner = None
-    if player_board_obj.board.winner is None and winning_space_ids(player_board_obj):
+    if win and board.winner_id is None and _claim_win(board, player_board_obj):
         winner = player_board_obj.player_name
-        player_board_obj.board.winner = player_board_obj
-        player_board_obj.board.save()
+
+    pboard_patch = None
+    if changed:
+        version = _increment_version(player_board_obj.board_id)
+        pboard_patch = PlayerBoardSerializer.render_patch(marking, win, version)
 
     if announce:
         space = Space.objects.get(pk=space_id)
-        game_state = {
-            'state': 'marking',
-            'marking_type': 'invalidate' if Color(to_state) == Color.INVALIDATED else 'complete',
-            'player': player_board_obj.player_name,
-            'goal': ConcreteGoal.from_space(space).description(),
-        }
-        return changed, game_state, winner
+        game_state = marking_announcement(player_board_obj.player_name, space, to_state)
+        return changed, pboard_patch, game_state, winner
     else:
-        return changed, None, winner
+        return changed, pboard_patch, None, winner
+
+
+@database_sync_to_async
+@transaction.atomic
+def mark_spaces_admin(board_id: int, marks: List[Tuple[str, int, int]]):
+    """
+    Mark many spaces on players' boards at once. Nothing is marked if any of the spaces is not on
+    the board.
+    :param marks: (player name, space ID, to state) for each marking, in the order they happened.
+    :return: (changed, announcements, winner) - changed is a bool that indicates whether any board
+             was changed or created. announcements is a list of the announcements that should be
+             made, in order. winner is the name of the player who won the game with these
+             markings, if any.
+    """
+    board = Board.objects.get(pk=board_id)
+    spaces = Space.objects.filter(board_id=board_id).in_bulk(set(m[1] for m in marks))
+    unknown = set(m[1] for m in marks) - spaces.keys()
+    if unknown:
+        print(f"Ignoring batch of marks on spaces not on board ID {board_id}: {unknown}")
+        return False, [], None
+
+    player_boards, created = get_or_create_player_boards(board_id, (m[0] for m in marks))
+    for player_board_obj in player_boards.values():
+        player_board_obj.board = board
+
+    changed_player_boards = []  # type: List[PlayerBoard]
+    announcements = []
+    for player_name, space_id, to_state in marks:
+        player_board_obj = player_boards[player_name]
+        marking, announce = player_board_obj.mark_space(space_id, to_state)
+        if marking and player_board_obj not in changed_player_boards:
+            changed_player_boards.append(player_board_obj)
+        if announce:
+            announcements.append(marking_announcement(player_name, spaces[space_id], to_state))
+
+    # Only check for a win once per player, after all of their markings are made
+    winner = None
+    for player_board_obj in changed_player_boards:
+        if (board.winner_id is None and winning_space_ids(player_board_obj)
+                and _claim_win(board, player_board_obj)):
+            winner = player_board_obj.player_name
+
+    if changed_player_boards:
+        _increment_version(board_id)
+
+    # A created player board is a change to the roster even if none of its markings changed
+    return bool(changed_player_boards) or created, announcements, winner
+
+
+def _claim_win(board: Board, player_board_obj: PlayerBoard) -> bool:
+    """
+    Make a player the winner of a game, unless another player has already won it.
+    :return: True if the player is now the winner.
+    """
+    claimed = Board.objects.filter(pk=board.pk, winner=None).update(winner=player_board_obj)
+    if claimed:
+        board.winner = player_board_obj
+    return bool(claimed)
+
+
+def _increment_version(board_id: int) -> int:
+    """
+    Increment the version of a board, which must be done in the same transaction as the change.
+    :return: The new version.
+    """
+    table = connection.ops.quote_name(Board._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {table} SET version = version + 1 WHERE id = %s RETURNING version",
+                       [board_id])
+        return cursor.fetchone()[0]
 
 
 @database_sync_to_async
+@transaction.atomic
 def mark_disconnected(player_board_id: int, disconnected: bool):
-    player_board_obj = PlayerBoard.objects.get(pk=player_board_id)
-    player_board_obj.disconnected_at = timezone.now() if disconnected else None
-    player_board_obj.save()
+    """
+    :return: True if reconnecting brought the player back onto the roster of player boards shown
+             to everyone, since they had been disconnected for too long.
+    """
+    return _mark_disconnected(PlayerBoard.objects.get(pk=player_board_id), disconnected)
+
+
+def _mark_disconnected(player_board_obj: PlayerBoard, disconnected: bool):
+    returned = (not disconnected and player_board_obj.disconnected_at is not None
+                and player_board_obj.disconnected_at <= timezone.now() - DISCONNECTED_TIMEOUT)
+
+    if disconnected or player_board_obj.disconnected_at is not None:
+        player_board_obj.disconnected_at = timezone.now() if disconnected else None
+        player_board_obj.save(update_fields=['disconnected_at'])
+
+    if returned:
+        _increment_version(player_board_obj.board_id)
+    return returned
 
 
 @database_sync_to_async
-def set_automarks(board_id: int, client_id: str, player_space_ids_map: Dict[str, Set[str]]):
-    changed = False
+@transaction.atomic
+def drop_disconnected(board_id: int, player_board_id: int):
+    """
+    :return: True if the player has been disconnected for `DISCONNECTED_TIMEOUT`, so that their
+             player board is no longer shown to everyone, in which case the version is incremented.
+    """
+    dropped = PlayerBoard.objects.filter(
+        pk=player_board_id, disconnected_at__lte=timezone.now() - DISCONNECTED_TIMEOUT
+    ).exists()
+    if dropped:
+        _increment_version(board_id)
+    return dropped
 
+
+@database_sync_to_async
+def get_board_version(board_id: int):
+    return Board.objects.values_list('version', flat=True).get(pk=board_id)
+
+
+@database_sync_to_async
+@transaction.atomic
+def set_automarks(board_id: int, client_id: str, player_space_ids_map: Dict[str, Set[str]]):
+    """
+    Make a plugin the auto-marker of exactly the given spaces, with a fixed number of queries
+    however many players and spaces there are.
+    :param player_space_ids_map: IDs of the spaces to auto-mark, by player name.
+    :return: (changed, created) - booleans that indicate whether the auto-marker of any space
+             changed, and whether any player board was created.
+    """
     # Cross = All combinations of (player name, space ID) tuples in the map
-    current_automark_pbms = (PlayerBoardMarking.objects
-                             .filter(player_board__board_id=board_id, auto_marker_client_id=client_id)
-                             .select_related('player_board'))
-    current_cross = set((a.player_board.player_name, a.space_id) for a in current_automark_pbms)
-
-    new_cross = set((pname, spcid) for pname, pset in player_space_ids_map.items() for spcid in pset)
-
-    # Create missing AutoMarks
-    for player_name, space_id in new_cross.difference(current_cross):
-        player_board = PlayerBoard.objects.get_or_create(board_id=board_id, player_name=player_name)[0]
-        PlayerBoardMarking.objects.filter(
-            player_board=player_board, space_id=space_id
-        ).update(auto_marker_client_id=client_id)
-        changed = True
-
-    # Delete removed AutoMarks
-    for player_name, space_id in current_cross.difference(new_cross):
-        current_automark_pbms.filter(
-            player_board__player_name=player_name, space_id=space_id
-        ).update(auto_marker_client_id='')
-        changed = True
-
-    return changed
+    current_cross = set(PlayerBoardMarking.objects.filter(
+        player_board__board_id=board_id, auto_marker_client_id=client_id
+    ).values_list('player_board__player_name', 'space_id'))
+    current_cross.update(AutoMark.objects.filter(
+        player_board__board_id=board_id, client_id=client_id
+    ).values_list('player_board__player_name', 'space_id'))
+
+    # Space IDs may arrive as strings, but are compared with the integers from the database
+    new_cross = set((pname, int(spcid)) for pname, pset in player_space_ids_map.items() for spcid in pset)
+
+    added = new_cross.difference(current_cross)
+    removed = current_cross.difference(new_cross)
+    if not added and not removed:
+        return False, False
+
+    player_boards, created = get_or_create_player_boards(
+        board_id, (pname for pname, _ in added | removed))
+    set_auto_markers(client_id, _space_ids_by_player_board(added, player_boards))
+    clear_auto_markers(client_id, _space_ids_by_player_board(removed, player_boards))
+    return True, created
+
+
+def _space_ids_by_player_board(cross: Set[Tuple[str, int]],
+                               player_boards: Dict[str, PlayerBoard]) -> Dict[PlayerBoard, Set[int]]:
+    space_ids = {}  # type: Dict[PlayerBoard, Set[int]]
+    for player_name, space_id in cross:
+        space_ids.setdefault(player_boards[player_name], set()).add(space_id)
+    return space_ids
@@ -0,0 +1,79 @@
+"""
+Recent `pboard_patch` events of each game, so that a client that reconnects can be sent only the
+patches it missed instead of every player board.
+
+Every version increment of a board is either a single patch, or a change that was only sent as a
+full `pboards` snapshot (such as a player joining). The log keeps an unbroken run of the most
+recent patches, and can only replay from a version if every increment after it was a patch.
+
+Events are recorded as consumers in this process receive them, so the log may be behind when no
+consumer in this process is in the game. Callers compare against the board's current version
+before trusting a replay.
+"""
+from collections import deque, OrderedDict
+from typing import Deque, List, Optional
+
+LOG_LENGTH = 256
+"""Number of patches kept for each game."""
+
+MAX_GAMES = 1000
+"""Number of games whose logs are kept. The least recently updated logs are dropped first."""
+
+
+class _GameLog:
+    def __init__(self, base_version: int):
+        self.base_version = base_version
+        """Version that the oldest patch in the log applies on top of."""
+        self.patches = deque()  # type: Deque[dict]
+
+    def latest_version(self) -> int:
+        return self.patches[-1]['version'] if self.patches else self.base_version
+
+
+_LOGS = OrderedDict()  # type: OrderedDict[int, _GameLog]
+
+
+def record_patch(board_id: int, patch: dict):
+    log = _LOGS.get(board_id)
+    version = patch['version']
+    if log is None or version > log.latest_version() + 1:
+        # Missed something in between, so this is the new start of the log
+        log = _GameLog(version - 1)
+        _LOGS[board_id] = log
+    elif version <= log.latest_version():
+        # Already recorded by another consumer
+        return
+
+    log.patches.append(patch)
+    if len(log.patches) > LOG_LENGTH:
+        log.base_version = log.patches.popleft()['version']
+    _touch(board_id)
+
+
+def record_snapshot(board_id: int, version: int):
+    log = _LOGS.get(board_id)
+    if log is None or version > log.latest_version():
+        # Whatever changed up to this version cannot be replayed as patches
+        _LOGS[board_id] = _GameLog(version)
+        _touch(board_id)
+
+
+def replay(board_id: int, since_version: int, current_version: int) -> Optional[List[dict]]:
+    """
+    Get the patches that bring a client from one version of a board to another.
+    :param since_version: The last version the client saw.
+    :param current_version: The board's current version.
+    :return: The patches in order, or None if the log does not cover that range.
+    """
+    log = _LOGS.get(board_id)
+    if log is None or log.latest_version() != current_version:
+        return None
+    if not log.base_version <= since_version <= current_version:
+        return None
+    return [p for p in log.patches if p['version'] > since_version]
+
+
+def _touch(board_id: int):
+    _LOGS.move_to_end(board_id)
+    while len(_LOGS) > MAX_GAMES:
+        _LOGS.popitem(last=False)
@@ -0,0 +1,427 @@
+"""
+In-memory state of games in progress, used when the `KEEP_GAMES_IN_MEMORY` setting is enabled.
+
+The first consumer to join a game loads its board, player boards and markings from the database
+into a `LiveGame`. From then on, consumers in this process read and modify the game in memory, and
+a background task writes the changes back to the database in batches. Anything not yet written is
+flushed when the process exits.
+
+Everything here must be called from the event loop thread, which is what keeps the in-memory state
+consistent without any locking.
+"""
+import asyncio
+import atexit
+import traceback
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from backend.active_roster import ActiveRoster
+from backend.models.auto_mark import AutoMark
+from backend.models.board import Board
+from backend.models.player_board import PlayerBoard, MARKINGS_PREFETCH, \
+    get_or_create_player_boards
+from backend.models.player_board_marking import PlayerBoardMarking
+from backend.serializers.board_player import BoardPlayerSerializer
+from backend.serializers.board_plugin import BoardPluginSerializer
+from backend.serializers.game_state import marking_announcement
+from backend.serializers.player_board import PlayerBoardSerializer
+from win_detection.win_detection import updated_winning_space_ids, winning_space_ids
+
+MARKING_FIELDS = ['color', 'covert_marked', 'auto_marker_client_id', 'marked_by_player', 'announced']
+
+UNLOAD_DELAY = 60
+"""
+Seconds that a game stays in memory after its last consumer leaves, so that everyone reloading
+the page at once does not cause it to be reloaded from the database.
+"""
+
+_LIVE_GAMES: Dict[int, 'LiveGame'] = {}
+_LOAD_LOCKS: Dict[int, asyncio.Lock] = {}
+
+
+async def get_live_game(board_id: int) -> 'LiveGame':
+    """
+    Get the in-memory state of a game, loading it from the database if it is not in memory yet.
+    """
+    live_game = _LIVE_GAMES.get(board_id)
+    if live_game:
+        return live_game
+
+    async with _LOAD_LOCKS.setdefault(board_id, asyncio.Lock()):
+        live_game = _LIVE_GAMES.get(board_id)
+        if not live_game:
+            live_game = await database_sync_to_async(LiveGame.load)(board_id)
+            _LIVE_GAMES[board_id] = live_game
+            live_game.start()
+    _LOAD_LOCKS.pop(board_id, None)
+
+    return live_game
+
+
+class LiveGame:
+    """
+    The authoritative state of one game. Methods mirror the database-backed functions in
+    `consumers.py` and return the same values.
+    """
+    def __init__(self, board: Board, player_boards: List[PlayerBoard]):
+        self.board = board
+        self.spaces = {space.pk: space for space in board.space_set.all()}
+        self.player_boards = {}  # type: Dict[int, PlayerBoard]
+        self.markings = {}  # type: Dict[int, Dict[int, PlayerBoardMarking]]
+        """Markings by player board ID, then by space ID."""
+        self.wins = {}  # type: Dict[int, Optional[List[int]]]
+        self.roster = {}  # type: Dict[str, str]
+        """Client IDs of the consumers connected to this game, by channel name."""
+        self.active_roster = ActiveRoster(board.pk, player_boards)
+
+        self._dirty_board = False
+        self._dirty_player_boards = set()  # type: Set[PlayerBoard]
+        self._dirty_markings = set()  # type: Set[PlayerBoardMarking]
+        self._flush_task = None  # type: Optional[asyncio.Task]
+        self._unload_task = None  # type: Optional[asyncio.Task]
+
+        for pboard in player_boards:
+            self._add_player_board(pboard)
+
+    @staticmethod
+    def load(board_id: int) -> 'LiveGame':
+        board = Board.objects.prefetch_related('space_set').get(pk=board_id)
+        board.space_ids()  # So that packed markings never need to query it on the event loop
+        player_boards = PlayerBoard.objects.prefetch_related(*MARKINGS_PREFETCH)\
+            .filter(board_id=board_id).order_by('pk')
+        return LiveGame(board, list(player_boards))
+
+    def start(self):
+        self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    def join(self, channel_name: str, client_id: str):
+        self.roster[channel_name] = client_id
+
+    def leave(self, channel_name: str):
+        self.roster.pop(channel_name, None)
+        if not self.roster and not self._unload_task:
+            self._unload_task = asyncio.ensure_future(self._unload_when_idle())
+
+    def render_pboards(self) -> dict:
+        """
+        In-memory equivalent of `PlayerBoardSerializer.render_shared`.
+        """
+        dropped = self.active_roster.dropped_ids()
+        pboards = [pb for pb in self.player_boards.values() if pb.pk not in dropped]
+        return PlayerBoardSerializer.render_shared_from(pboards, self.board.version, self.wins)
+
+    def render_board_player(self, player_board_id: Optional[int]) -> dict:
+        markings = self.markings.get(player_board_id, {}).values()
+        return BoardPlayerSerializer.from_board(self.board, list(markings))
+
+    def render_board_plugin(self) -> dict:
+        return BoardPluginSerializer.from_board(self.board)
+
+    async def get_or_create_player_board(self, player_name: str) -> Tuple[PlayerBoard, bool]:
+        pboard = self._player_board_named(player_name)
+        if pboard is not None:
+            return pboard, False
+
+        pboard = await database_sync_to_async(self._create_player_board)(player_name)
+        # Another consumer may have added the same player while this one was waiting
+        if pboard.pk in self.player_boards:
+            return self.player_boards[pboard.pk], False
+
+        self._add_player_board(pboard)
+        self.board.version += 1
+        self._dirty_board = True
+        return pboard, True
+
+    async def get_or_create_player_boards(self, player_names: Iterable[str]):
+        """
+        Same as `get_or_create_player_board` for each of many players, but creating all of the
+        missing player boards in one round trip to the database.
+        :return: True if any player board was added to the game.
+        """
+        missing = [name for name in player_names if self._player_board_named(name) is None]
+        if not missing:
+            return False
+
+        added = False
+        player_boards = await database_sync_to_async(self._create_player_boards)(missing)
+        for pboard in player_boards:
+            # Another consumer may have added the same player while this one was waiting
+            if pboard.pk not in self.player_boards:
+                self._add_player_board(pboard)
+                self.board.version += 1
+                self._dirty_board = True
+                added = True
+        return added
+
+    async def mark_space_player(self, player_board_id: int, space_id: int,
+                                to_state: int = None, covert_marked: bool = None):
+        pboard = self.player_boards[player_board_id]
+        return self._mark_space(pboard, space_id, to_state, covert_marked, as_player=True)
+
+    async def mark_space_admin(self, player_name: str, space_id: int, to_state: int):
+        pboard, created = await self.get_or_create_player_board(player_name)
+        changed, pboard_patch, game_state, winner = self._mark_space(
+            pboard, space_id, to_state, None, as_player=False)
+        if created:
+            return True, None, game_state, winner
+        return changed, pboard_patch, game_state, winner
+
+    async def mark_spaces_admin(self, marks: List[Tuple[str, int, int]]):
+        unknown = set(space_id for _, space_id, _ in marks) - self.spaces.keys()
+        if unknown:
+            print(f"Ignoring batch of marks on spaces not on board ID {self.board.pk}: {unknown}")
+            return False, [], None
+
+        created = await self.get_or_create_player_boards(set(m[0] for m in marks))
+        player_boards = [self._player_board_named(player_name) for player_name, _, _ in marks]
+
+        changed_player_boards = []  # type: List[PlayerBoard]
+        announcements = []
+        for pboard, (player_name, space_id, to_state) in zip(player_boards, marks):
+            marking = self.markings[pboard.pk][space_id]
+            changed, announce = marking.apply_mark(to_state)
+            if changed:
+                self._mark_dirty(pboard, marking)
+                if pboard not in changed_player_boards:
+                    changed_player_boards.append(pboard)
+            if announce:
+                announcements.append(
+                    marking_announcement(player_name, self.spaces[space_id], to_state))
+
+        winner = None
+        for pboard in changed_player_boards:
+            win = winning_space_ids(pboard, list(self.markings[pboard.pk].values()))
+            self.wins[pboard.pk] = win
+            if self.board.winner_id is None and win:
+                winner = pboard.player_name
+                self.board.winner = pboard
+
+        if changed_player_boards:
+            self.board.version += 1
+            self._dirty_board = True
+
+        # A created player board is a change to the roster even if none of its markings changed
+        return bool(changed_player_boards) or created, announcements, winner
+
+    async def mark_disconnected(self, player_board_id: int, disconnected: bool):
+        pboard = self.player_boards[player_board_id]
+        # Disconnects are recorded on the roster by the consumer, which is needed to announce them
+        returned = not disconnected and self.active_roster.connect(player_board_id)
+
+        if disconnected or pboard.disconnected_at is not None:
+            pboard.disconnected_at = timezone.now() if disconnected else None
+            self._dirty_player_boards.add(pboard)
+
+        if returned:
+            self.roster_changed()
+        return returned
+
+    def roster_changed(self):
+        """
+        Record a change to the roster of player boards shown to everyone, such as players being
+        dropped from `active_roster`.
+        """
+        self.board.version += 1
+        self._dirty_board = True
+
+    async def set_automarks(self, client_id: str, player_space_ids_map: Dict[str, Set[str]]):
+        changed = False
+
+        created = await self.get_or_create_player_boards(player_space_ids_map)
+
+        for pboard in self.player_boards.values():
+            space_ids = set(int(s) for s in player_space_ids_map.get(pboard.player_name, ()))
+            for marking in self.markings[pboard.pk].values():
+                if marking.space_id in space_ids:
+                    new_client_id = client_id
+                elif marking.auto_marker_client_id == client_id:
+                    new_client_id = ''
+                else:
+                    continue
+
+                if marking.auto_marker_client_id != new_client_id:
+                    marking.auto_marker_client_id = new_client_id
+                    self._mark_dirty(pboard, marking)
+                    changed = True
+
+        return changed, created
+
+    async def reveal_board(self, revealed: bool = True):
+        new_obscured = not revealed
+        if self.board.obscured != new_obscured:
+            self.board.obscured = new_obscured
+            self._dirty_board = True
+            return True
+        else:
+            return False
+
+    async def flush(self):
+        """
+        Write all changes made since the last flush to the database.
+        """
+        dirty = self._take_dirty()
+        if not any(dirty):
+            return
+
+        try:
+            await database_sync_to_async(_write_rows)(self.board.pk, *self._rows(*dirty))
+        except Exception:
+            print(f"Failed to save game {self.board}, will retry:")
+            traceback.print_exc()
+            self._restore_dirty(*dirty)
+
+    def flush_now(self):
+        """
+        Synchronous version of `flush`, for use when the event loop is no longer running.
+        """
+        dirty = self._take_dirty()
+        if any(dirty):
+            _write_rows(self.board.pk, *self._rows(*dirty))
+
+    def _mark_space(self, pboard: PlayerBoard, space_id: int, to_state: Optional[int],
+                    covert_marked: Optional[bool], as_player: bool):
+        marking = self.markings[pboard.pk][space_id]
+        changed, announce = marking.apply_mark(to_state, covert_marked, as_player)
+
+        pboard_patch = None
+        winner = None
+        if changed:
+            self._mark_dirty(pboard, marking)
+            win = updated_winning_space_ids(pboard, list(self.markings[pboard.pk].values()),
+                                            space_id, self.wins[pboard.pk])
+            self.wins[pboard.pk] = win
+
+            if self.board.winner_id is None and win:
+                winner = pboard.player_name
+                self.board.winner = pboard
+
+            self.board.version += 1
+            self._dirty_board = True
+            pboard_patch = PlayerBoardSerializer.render_patch(marking, win, self.board.version)
+
+        game_state = None
+        if announce:
+            game_state = marking_announcement(pboard.player_name, self.spaces[space_id], to_state)
+
+        return changed, pboard_patch, game_state, winner
+
+    def _player_board_named(self, player_name: str) -> Optional[PlayerBoard]:
+        return next((pb for pb in self.player_boards.values() if pb.player_name == player_name),
+                    None)
+
+    def _create_player_board(self, player_name: str) -> PlayerBoard:
+        pboard = PlayerBoard.objects.get_or_create(board_id=self.board.pk, player_name=player_name)[0]
+        prefetch_related_objects([pboard], *MARKINGS_PREFETCH)
+        return pboard
+
+    def _create_player_boards(self, player_names: List[str]) -> List[PlayerBoard]:
+        player_boards = list(get_or_create_player_boards(self.board.pk, player_names)[0].values())
+        prefetch_related_objects(player_boards, *MARKINGS_PREFETCH)
+        return player_boards
+
+    def _add_player_board(self, pboard: PlayerBoard):
+        """
+        Start tracking a player board whose markings have been prefetched, pointing all of its
+        relations at the objects already in memory so that nothing is lazily queried later.
+        """
+        pboard.board = self.board
+        markings = pboard.get_markings(spaces=self.spaces, with_automarks=True)
+
+        self.player_boards[pboard.pk] = pboard
+        self.markings[pboard.pk] = {m.space_id: m for m in markings}
+        self.wins[pboard.pk] = winning_space_ids(pboard, markings)
+
+    def _mark_dirty(self, pboard: PlayerBoard, marking: PlayerBoardMarking):
+        if pboard.packed_markings is None:
+            self._dirty_markings.add(marking)
+        else:
+            # Packed markings are rendered from `packed_markings`, so keep it up to date
+            pboard.store_markings([marking])
+            self._dirty_player_boards.add(pboard)
+
+    def _take_dirty(self):
+        dirty = (self._dirty_board, self._dirty_player_boards, self._dirty_markings)
+        self._dirty_board = False
+        self._dirty_player_boards = set()
+        self._dirty_markings = set()
+        return dirty
+
+    def _restore_dirty(self, board: bool, player_boards: Set[PlayerBoard],
+                       markings: Set[PlayerBoardMarking]):
+        self._dirty_board = self._dirty_board or board
+        self._dirty_player_boards.update(player_boards)
+        self._dirty_markings.update(markings)
+
+    def _rows(self, board: bool, player_boards: Set[PlayerBoard],
+              markings: Set[PlayerBoardMarking]):
+        """
+        Copy the values to be written, so that the write can happen on another thread while the
+        originals keep changing.
+        """
+        board_values = None
+        if board:
+            board_values = {
+                'obscured': self.board.obscured,
+                'winner_id': self.board.winner_id,
+                'version': self.board.version,
+            }
+        player_board_rows = [PlayerBoard(id=pb.pk, disconnected_at=pb.disconnected_at,
+                                         packed_markings=pb.packed_markings)
+                             for pb in player_boards]
+        marking_rows = [PlayerBoardMarking(id=m.pk, **{f: getattr(m, f) for f in MARKING_FIELDS})
+                        for m in markings]
+        automark_rows = [AutoMark(player_board_id=pb.pk, space_id=m.space_id,
+                                  client_id=m.auto_marker_client_id)
+                         for pb in player_boards if pb.packed_markings is not None
+                         for m in self.markings[pb.pk].values() if m.auto_marker_client_id]
+        return board_values, player_board_rows, marking_rows, automark_rows
+
+    async def _flush_periodically(self):
+        # Stops after one last flush once this game is unloaded
+        while _LIVE_GAMES.get(self.board.pk) is self:
+            await asyncio.sleep(settings.GAME_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def _unload_when_idle(self):
+        await asyncio.sleep(UNLOAD_DELAY)
+        await self.flush()
+
+        self._unload_task = None
+        if not self.roster:
+            del _LIVE_GAMES[self.board.pk]
+            self.active_roster.stop()
+
+
+@transaction.atomic
+def _write_rows(board_id: int, board_values: Optional[dict],
+                player_board_rows: List[PlayerBoard], marking_rows: List[PlayerBoardMarking],
+                automark_rows: List[AutoMark]):
+    """
+    :param automark_rows: Every AutoMark of the player boards in `player_board_rows` that have
+                          packed markings.
+    """
+    if board_values:
+        Board.objects.filter(pk=board_id).update(**board_values)
+    if player_board_rows:
+        PlayerBoard.objects.bulk_update(player_board_rows, ['disconnected_at', 'packed_markings'])
+        AutoMark.objects.filter(
+            player_board__in=[pb.pk for pb in player_board_rows if pb.packed_markings is not None]
+        ).delete()
+        AutoMark.objects.bulk_create(automark_rows)
+    if marking_rows:
+        PlayerBoardMarking.objects.bulk_update(marking_rows, MARKING_FIELDS)
+
+
+@atexit.register
+def _flush_all_on_exit():
+    for live_game in list(_LIVE_GAMES.values()):
+        try:
+            live_game.flush_now()
+        except Exception:
+            print(f"Failed to save game {live_game.board} on exit:")
+            traceback.print_exc()
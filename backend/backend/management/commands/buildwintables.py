@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from win_detection import win_table
+from win_detection.wd_hex_snake import build_win_tables
+
+
+class Command(BaseCommand):
+    help = "Build the tables that hexagon boards are checked for wins with (see " \
+           "win_detection.win_table). Server processes that are already running keep using the " \
+           "tables they had loaded until they restart."
+
+    def handle(self, *args, **options):
+        for name, table in build_win_tables().items():
+            win_table.save(name, table)
+            print(f"Built win table {name}")
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from generation import board_pool
+
+
+class Command(BaseCommand):
+    help = "Fill the pools of pre-generated boards (see generation.board_pool) for the default win " \
+           "detector of each board shape, and for every other combination that already has a pool."
+
+    def handle(self, *args, **options):
+        if settings.BOARD_POOL_SIZE <= 0:
+            print("The board pool is disabled by the BOARD_POOL_SIZE setting.")
+            return
+
+        for shape, win_detector in sorted(board_pool.pooled_combinations()):
+            generated = board_pool.fill(shape, win_detector)
+            print(f"Generated {generated} pooled {shape} boards with {win_detector}")
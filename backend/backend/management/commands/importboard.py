@@ -19,7 +19,7 @@ class Command(BaseCommand):
         print(js)
 
         board = Board.objects.create(game_code=game_code, seed='', difficulty=2)
-        spaces = board.space_set.order_by('position')
+        spaces = board.space_set.order_by('y', 'x')
         for pos, goal in enumerate(js):
             print(pos)
             spc = spaces[pos]
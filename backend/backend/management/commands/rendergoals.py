@@ -0,0 +1,44 @@
+from django.core.management import BaseCommand, CommandError
+
+from backend.models.space import Space
+from generation.goals import ConcreteGoal
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Re-render the goal text stored on spaces, such as after editing goals.yml. Games that " \
+           "are kept in memory only pick up the changes once they are reloaded."
+
+    def add_arguments(self, parser):
+        parser.add_argument('game_codes', nargs='*', type=str,
+                            help="Only re-render the boards of these games.")
+        parser.add_argument('--unrendered', action='store_true',
+                            help="Only render spaces that have never been rendered, such as those "
+                                 "of boards created before goals were stored on spaces.")
+
+    def handle(self, *args, **options):
+        spaces = Space.objects.prefetch_related('setvariable_set').order_by('pk')
+        if options['game_codes']:
+            spaces = spaces.filter(board__game_code__in=options['game_codes'])
+        if options['unrendered']:
+            spaces = spaces.filter(text='')
+
+        rendered = []
+        failed = 0
+        for space in spaces.iterator(chunk_size=BATCH_SIZE):
+            try:
+                goal = ConcreteGoal.from_space(space)
+            except RuntimeError as e:
+                print(f"Could not render space {space.pk}: {e}")
+                failed += 1
+                continue
+            space.render_goal(goal)
+            rendered.append(space)
+
+        Space.objects.bulk_update(rendered, ['text', 'tooltip', 'goal_type', 'variables'],
+                                  batch_size=BATCH_SIZE)
+        print(f"Rendered {len(rendered)} spaces.")
+        if failed:
+            raise CommandError(f"Could not render {failed} spaces, whose goals may have been "
+                               f"removed from goals.yml.")
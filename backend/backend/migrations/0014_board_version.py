@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 23:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0013_alter_board_id_alter_playerboard_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-17 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0014_board_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='board',
+            name='pooled',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.2 on 2026-10-17 23:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0015_board_pooled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='space',
+            name='goal_type',
+            field=models.CharField(default='default', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='space',
+            name='text',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='space',
+            name='tooltip',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='space',
+            name='variables',
+            field=models.JSONField(default=dict),
+        ),
+    ]
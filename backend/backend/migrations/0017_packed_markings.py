@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-17 23:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0016_space_rendered_goal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerboard',
+            name='packed_markings',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.CreateModel(
+            name='AutoMark',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('client_id', models.CharField(max_length=1024)),
+                ('player_board', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend.playerboard')),
+                ('space', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='backend.space')),
+            ],
+            options={
+                'unique_together': {('player_board', 'space')},
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.1.2 on 2026-10-17 23:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_positions(apps, schema_editor):
+    Space = apps.get_model('backend', 'Space')
+    Position = apps.get_model('backend', 'Position')
+    position = Position.objects.filter(pk=OuterRef('position_id'))
+    Space.objects.update(x=Subquery(position.values('x')[:1]), y=Subquery(position.values('y')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0017_packed_markings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='space',
+            name='x',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='space',
+            name='y',
+            field=models.IntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_positions, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='space',
+            name='position',
+        ),
+        migrations.DeleteModel(
+            name='Position',
+        ),
+    ]
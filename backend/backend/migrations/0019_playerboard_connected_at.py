@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0018_flatten_position'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playerboard',
+            name='connected_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
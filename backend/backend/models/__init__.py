@@ -1,8 +1,8 @@
 from .board_shape import BoardShape
 from .color import Color
 
+from .auto_mark import AutoMark
 from .board import Board
 from .player_board import PlayerBoard, PlayerBoardMarking
-from .position import Position
 from .set_variable import SetVariable
 from .space import Space
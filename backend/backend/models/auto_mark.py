@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class AutoMark(models.Model):
+    """
+    A plugin that is auto-marking a space for a player whose markings are packed (see
+    `PlayerBoard.packed_markings`). Takes the place of `PlayerBoardMarking.auto_marker_client_id`.
+    """
+    id = models.AutoField(primary_key=True)
+    player_board = models.ForeignKey('PlayerBoard', on_delete=models.CASCADE)
+    space = models.ForeignKey('Space', on_delete=models.CASCADE)
+    client_id = models.CharField(max_length=1024)
+
+    class Meta:
+        unique_together = ['player_board', 'space']
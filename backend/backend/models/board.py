@@ -1,6 +1,11 @@
+from functools import lru_cache
+from typing import Tuple
+
 from django.db import models
 
 from backend.models.board_shape import BoardShape
+from backend.models.space import Space
+from win_detection.board_geometry import BoardGeometry
 from win_detection.win_detection import win_detector_choices
 
 
@@ -14,5 +19,51 @@ class Board(models.Model):
 
     obscured = models.BooleanField(default=True)
 
+    version = models.IntegerField(default=0)
+    """
+    Incremented each time a marking on this board changes or a player joins the roster of player
+    boards, so that clients receiving incremental updates can detect when they have missed one.
+    """
+
+    pooled = models.BooleanField(default=False, db_index=True)
+    """
+    True if this board was generated ahead of time and is waiting in the pool to be claimed by a
+    new game. See `generation.board_pool`.
+    """
+
     def __str__(self):
         return self.game_code
+
+    def space_ids(self) -> Tuple[int, ...]:
+        """
+        Get the IDs of this board's spaces in order of position, which is the order of packed
+        player board markings. Only looked up once for each Board object.
+        """
+        return self.geometry().space_ids
+
+    def geometry(self) -> BoardGeometry:
+        """
+        Get the IDs and positions of this board's spaces, which win detectors work from. Only
+        looked up once for each Board object.
+        """
+        if getattr(self, '_geometry', None) is None:
+            self._geometry = board_geometry(self.pk)
+        return self._geometry
+
+
+@lru_cache(maxsize=1024)
+def board_geometry(board_id: int) -> BoardGeometry:
+    """
+    Same as `Board.geometry`, without loading the board. Spaces do not change once a board is
+    generated, so this is cached.
+    """
+    spaces = list(Space.objects.filter(board_id=board_id).order_by('y', 'x')
+                  .values_list('pk', 'x', 'y'))
+    return BoardGeometry(tuple(pk for pk, _, _ in spaces), tuple((x, y) for _, x, y in spaces))
+
+
+def board_space_ids(board_id: int) -> Tuple[int, ...]:
+    """
+    Same as `Board.space_ids`, without loading the board.
+    """
+    return board_geometry(board_id).space_ids
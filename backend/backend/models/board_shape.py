@@ -1,6 +1,28 @@
+from typing import List, Tuple
+
 from django.db import models
 
 
 class BoardShape(models.TextChoices):
     SQUARE = 'square'
     HEXAGON = 'hexagon'
+
+
+def get_positions(shape: BoardShape) -> List[Tuple[int, int]]:
+    """
+    Get a list of positions for the spaces on this board.
+    :param shape: Shape of the board, square or hexagon.
+    :return: A list of (x, y) coordinates, as described in `Space`, in order of position.
+    """
+    if shape == BoardShape.HEXAGON:
+        positions = [
+            (1, 0), (2, 0), (3, 0), (4, 0),
+            (0, 1), (1, 1), (2, 1), (3, 1), (4, 1),
+            (-1, 2), (0, 2), (1, 2), (2, 2), (3, 2), (4, 2),
+            (-1, 3), (0, 3), (1, 3), (2, 3), (3, 3),
+            (-1, 4), (0, 4), (1, 4), (2, 4),
+        ]
+    else:
+        positions = [((i % 5), (i // 5)) for i in range(25)]
+
+    return positions
@@ -1,9 +1,28 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Q
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from backend.models.auto_mark import AutoMark
+from backend.models.board import Board, board_space_ids
 from backend.models.color import Color
 from backend.models.player_board_marking import PlayerBoardMarking
+from backend.models.space import Space
+
+# Bits of each byte of `PlayerBoard.packed_markings`
+PACKED_COLOR = 0x0f
+PACKED_COVERT_MARKED = 0x10
+PACKED_MARKED_BY_PLAYER = 0x20
+PACKED_ANNOUNCED = 0x40
+
+MARKINGS_PREFETCH = ['playerboardmarking_set', 'automark_set']
+"""
+Relations to prefetch so that `PlayerBoard.get_markings` does not query, however the markings
+are stored.
+"""
 
 
 class PlayerBoard(models.Model):
@@ -16,6 +35,21 @@ class PlayerBoard(models.Model):
     markings = models.ManyToManyField('Space', through='PlayerBoardMarking')
     disconnected_at = models.DateTimeField(null=True)
 
+    connected_at = models.DateTimeField(null=True)
+    """
+    When the player last connected, if their game is not kept in memory. Disconnects are written a
+    little after they happen (see `roster_batching`), and are not written if the player has
+    connected again since.
+    """
+
+    packed_markings = models.BinaryField(null=True)
+    """
+    If set, this player's markings are stored here rather than as `PlayerBoardMarking` rows, one
+    byte per space in order of position (see `Board.space_ids`), and which plugins are auto-marking
+    them is stored as `AutoMark` rows. Player boards are created this way if the
+    `PACK_PLAYER_BOARD_MARKINGS` setting is enabled.
+    """
+
     def __str__(self):
         return str(self.board) + " : " + self.player_name
 
@@ -25,35 +59,215 @@ class PlayerBoard(models.Model):
     def mark_space(self, space_id: int, to_state: Color = None, covert_marked: bool = None,
                    as_player: bool = False):
         """
-        Mark a space on this player's board to a specified state.
-        :return: (changed, announce) - a pair of booleans that indicate whether the board was
-                 changed and whether it should be announced.
+        Mark a space on this player's board to a specified state. Safe to call concurrently with
+        other marks of the same board without locking it.
+        :return: (marking, announce) - the marking after the change, or None if the board was not
+                 changed, and a boolean that indicates whether it should be announced.
+        """
+        if self.packed_markings is None:
+            return PlayerBoardMarking.mark(self.pk, space_id, to_state, covert_marked, as_player)
+
+        while True:
+            # The whole board is rewritten to change one marking, so only write it if no other
+            #  mark has been written since it was read, and try again otherwise
+            packed = PlayerBoard.objects.values_list('packed_markings', flat=True).get(pk=self.pk)
+            self.packed_markings = bytes(packed)
+            marking = self.get_marking(space_id)
+            changed, announce = marking.apply_mark(to_state, covert_marked, as_player)
+            if not changed:
+                return None, False
+
+            self.store_markings([marking])
+            if PlayerBoard.objects.filter(pk=self.pk, packed_markings=packed)\
+                    .update(packed_markings=self.packed_markings):
+                return marking, announce
+
+    def get_markings(self, spaces: Dict[int, Space] = None,
+                     with_automarks: bool = False) -> List[PlayerBoardMarking]:
+        """
+        Get this player's markings, however they are stored. Packed markings are returned as
+        unsaved PlayerBoardMarking objects, and changes to them must be copied back into
+        `packed_markings` with `store_markings`.
+        :param spaces: Spaces of this board by ID, to set on the markings so that they are not
+                       queried later.
+        :param with_automarks: Whether to load which plugins are auto-marking packed markings. If
+                               False, their `auto_marker_client_id` is left blank.
+        """
+        if self.packed_markings is None:
+            markings = list(self.playerboardmarking_set.all())
+        else:
+            automarks = {}
+            if with_automarks:
+                automarks = {a.space_id: a.client_id for a in self.automark_set.all()}
+            markings = [
+                _unpack_marking(self, space_id, packed, automarks.get(space_id, ''))
+                for space_id, packed in zip(self._space_ids(), bytes(self.packed_markings))
+            ]
+
+        if spaces is not None:
+            for marking in markings:
+                marking.space = spaces[marking.space_id]
+        return markings
+
+    def get_colors(self) -> Tuple[int, ...]:
+        """
+        Get the color of each of this player's markings, in order of position (see
+        `Board.geometry`), however they are stored. Does not query if the markings are packed or
+        have been prefetched.
         """
-        marking = self.playerboardmarking_set.get(space_id=space_id)
+        if self.packed_markings is not None:
+            return tuple(packed & PACKED_COLOR for packed in bytes(self.packed_markings))
+        colors = {marking.space_id: marking.color for marking in self.playerboardmarking_set.all()}
+        return tuple(colors[space_id] for space_id in self._space_ids())
+
+    def get_marking(self, space_id: int) -> PlayerBoardMarking:
+        if self.packed_markings is None:
+            return self.playerboardmarking_set.get(space_id=space_id)
+        index = self._space_ids().index(space_id)
+        return _unpack_marking(self, space_id, self.packed_markings[index], '')
+
+    def store_markings(self, markings: Iterable[PlayerBoardMarking]):
+        """
+        Copy changed markings into `packed_markings` without saving. Does nothing if this player's
+        markings are not packed.
+        """
+        if self.packed_markings is None:
+            return
+        packed = bytearray(self.packed_markings)
+        space_ids = self._space_ids()
+        for marking in markings:
+            packed[space_ids.index(marking.space_id)] = _pack_marking(marking)
+        self.packed_markings = bytes(packed)
+
+    def _space_ids(self) -> Tuple[int, ...]:
+        # Prefer the loaded board's copy, which is never evicted while the board is in use
+        if PlayerBoard.board.is_cached(self):
+            return self.board.space_ids()
+        return board_space_ids(self.board_id)
+
 
-        if not as_player and marking.marked_by_player:
-            return False, False
+def _pack_marking(marking: PlayerBoardMarking) -> int:
+    return (marking.color
+            | (PACKED_COVERT_MARKED if marking.covert_marked else 0)
+            | (PACKED_MARKED_BY_PLAYER if marking.marked_by_player else 0)
+            | (PACKED_ANNOUNCED if marking.announced else 0))
 
-        changed = False
-        if to_state is not None and marking.color != to_state:
-            marking.color = to_state
-            changed = True
-        if covert_marked is not None and marking.covert_marked != covert_marked:
-            marking.covert_marked = covert_marked
-            changed = True
-        if to_state is not None and as_player:
-            marking.marked_by_player = True
-            changed = True
 
-        announce = False
-        if changed and to_state in [Color.COMPLETE, Color.INVALIDATED] and not marking.announced:
-            marking.announced = True
-            announce = True
+def _unpack_marking(pboard: PlayerBoard, space_id: int, packed: int,
+                    auto_marker_client_id: str) -> PlayerBoardMarking:
+    return PlayerBoardMarking(
+        player_board=pboard,
+        space_id=space_id,
+        color=packed & PACKED_COLOR,
+        covert_marked=bool(packed & PACKED_COVERT_MARKED),
+        marked_by_player=bool(packed & PACKED_MARKED_BY_PLAYER),
+        announced=bool(packed & PACKED_ANNOUNCED),
+        auto_marker_client_id=auto_marker_client_id,
+    )
 
-        if changed:
-            marking.save()
 
-        return changed, announce
+def set_auto_markers(client_id: str, space_ids: Dict[PlayerBoard, Set[int]]):
+    """
+    Make a plugin the auto-marker of spaces on players' boards, replacing any other plugin, with a
+    fixed number of queries however many spaces there are.
+    :param space_ids: IDs of the spaces to auto-mark, by player board.
+    """
+    rows, packed = _split_by_storage(space_ids)
+    if rows:
+        PlayerBoardMarking.objects.filter(rows).update(auto_marker_client_id=client_id)
+    if packed:
+        AutoMark.objects.filter(packed).delete()
+        AutoMark.objects.bulk_create(
+            AutoMark(player_board=pboard, space_id=space_id, client_id=client_id)
+            for pboard, pboard_space_ids in space_ids.items() if pboard.packed_markings is not None
+            for space_id in pboard_space_ids
+        )
+
+
+def clear_auto_markers(client_id: str, space_ids: Dict[PlayerBoard, Set[int]]):
+    """
+    Stop a plugin from auto-marking spaces on players' boards, where it is the spaces'
+    auto-marker. Makes a fixed number of queries however many spaces there are.
+    :param space_ids: IDs of the spaces to stop auto-marking, by player board.
+    """
+    rows, packed = _split_by_storage(space_ids)
+    if rows:
+        PlayerBoardMarking.objects.filter(rows, auto_marker_client_id=client_id)\
+            .update(auto_marker_client_id='')
+    if packed:
+        AutoMark.objects.filter(packed, client_id=client_id).delete()
+
+
+def _split_by_storage(space_ids: Dict[PlayerBoard, Set[int]]) -> Tuple[Q, Q]:
+    """
+    :return: Filters that match the given spaces of player boards whose markings are stored as rows
+             and of those whose markings are packed, or empty filters if there are none.
+    """
+    rows, packed = Q(), Q()
+    for pboard, pboard_space_ids in space_ids.items():
+        if not pboard_space_ids:
+            continue
+        spaces_q = Q(player_board_id=pboard.pk, space_id__in=pboard_space_ids)
+        if pboard.packed_markings is None:
+            rows |= spaces_q
+        else:
+            packed |= spaces_q
+    return rows, packed
+
+
+def get_or_create_player_boards(board_id: int, player_names: Iterable[str]) \
+        -> Tuple[Dict[str, PlayerBoard], bool]:
+    """
+    Same as `get_or_create` for each of many players in a game, but with a fixed number of queries
+    however many player boards are created.
+    :return: (player_boards, created) - the player boards by player name, and a boolean that
+             indicates whether any of them were created.
+    """
+    player_names = set(player_names)
+    player_boards = {
+        pboard.player_name: pboard
+        for pboard in PlayerBoard.objects.filter(board_id=board_id, player_name__in=player_names)
+    }
+
+    created = [PlayerBoard(board_id=board_id, player_name=player_name)
+               for player_name in sorted(player_names) if player_name not in player_boards]
+    if not created:
+        return player_boards, False
+
+    # `bulk_create` does not send `post_save`, so this does the work of `build_player_board`
+    initial_markings = _initial_markings(board_id)
+    if settings.PACK_PLAYER_BOARD_MARKINGS:
+        packed_markings = bytes(_pack_marking(m) for m in _new_markings(None, initial_markings))
+        for pboard in created:
+            pboard.packed_markings = packed_markings
+    # Relies on the database returning the primary keys of bulk inserted rows
+    PlayerBoard.objects.bulk_create(created)
+    if not settings.PACK_PLAYER_BOARD_MARKINGS:
+        PlayerBoardMarking.objects.bulk_create(
+            m for pboard in created for m in _new_markings(pboard, initial_markings)
+        )
+
+    Board.objects.filter(pk=board_id).update(version=F('version') + 1)
+    for pboard in created:
+        print(f"Created a new player board with board ID {board_id}, player {pboard.player_name}")
+        player_boards[pboard.player_name] = pboard
+    return player_boards, True
+
+
+def _initial_markings(board_id: int) -> List[Tuple[int, int]]:
+    """
+    :return: The space ID and initial color of each marking on a new player board, in order of
+             position.
+    """
+    spaces = Space.objects.filter(board_id=board_id).order_by('y', 'x')
+    return [(space_id, Space.initial_state_of_goal_type(goal_type))
+            for space_id, goal_type in spaces.values_list('pk', 'goal_type')]
+
+
+def _new_markings(pboard: Optional[PlayerBoard],
+                  initial_markings: List[Tuple[int, int]]) -> List[PlayerBoardMarking]:
+    return [PlayerBoardMarking(space_id=space_id, player_board=pboard, color=color)
+            for space_id, color in initial_markings]
 
 
 @receiver(post_save, sender=PlayerBoard)
@@ -62,9 +276,12 @@ def build_player_board(instance: PlayerBoard, created: bool, **kwargs):
         print(f"Created a new player board with game code {instance.board.game_code}, "
               f"player {instance.player_name}")
 
-        for space in instance.board.space_set.order_by('position').all():
-            PlayerBoardMarking.objects.create(
-                space=space,
-                player_board=instance,
-                color=space.initial_state(),
-            )
+        markings = _new_markings(instance, _initial_markings(instance.board_id))
+        if settings.PACK_PLAYER_BOARD_MARKINGS:
+            instance.packed_markings = bytes(_pack_marking(m) for m in markings)
+            PlayerBoard.objects.filter(pk=instance.pk).update(packed_markings=instance.packed_markings)
+        else:
+            PlayerBoardMarking.objects.bulk_create(markings)
+
+        # Joining the roster of players is a change to the board
+        Board.objects.filter(pk=instance.board_id).update(version=F('version') + 1)
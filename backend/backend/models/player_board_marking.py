@@ -1,7 +1,14 @@
-from django.db import models
+from typing import Optional, Tuple
+
+from django.db import connection, models
 
 from backend.models.color import Color
 
+ANNOUNCED_COLORS = [Color.COMPLETE, Color.INVALIDATED]
+"""
+Colors that are announced to everyone the first time that a space is marked with them.
+"""
+
 
 class PlayerBoardMarking(models.Model):
     id = models.AutoField(primary_key=True)
@@ -24,3 +31,82 @@ class PlayerBoardMarking(models.Model):
     """
 
     announced = models.BooleanField(default=False)
+
+    def apply_mark(self, to_state: Color = None, covert_marked: bool = None,
+                   as_player: bool = False):
+        """
+        Change this marking to a specified state without saving it.
+        :return: (changed, announce) - a pair of booleans that indicate whether the marking was
+                 changed and whether it should be announced.
+        """
+        if not as_player and self.marked_by_player:
+            return False, False
+
+        changed = False
+        if to_state is not None and self.color != to_state:
+            self.color = to_state
+            changed = True
+        if covert_marked is not None and self.covert_marked != covert_marked:
+            self.covert_marked = covert_marked
+            changed = True
+        if to_state is not None and as_player:
+            self.marked_by_player = True
+            changed = True
+
+        announce = False
+        if changed and to_state in ANNOUNCED_COLORS and not self.announced:
+            self.announced = True
+            announce = True
+
+        return changed, announce
+
+    @staticmethod
+    def mark(player_board_id: int, space_id: int, to_state: Color = None,
+             covert_marked: bool = None, as_player: bool = False
+             ) -> Tuple[Optional['PlayerBoardMarking'], bool]:
+        """
+        Same as `apply_mark`, but made by a single conditional update in the database, so that
+        concurrent marks of the same space are applied one after the other.
+        :return: (marking, announce) - the marking after the change, or None if it was not
+                 changed, and a boolean that indicates whether it should be announced.
+        """
+        player_marked = to_state is not None and as_player
+        announced_color = to_state in ANNOUNCED_COLORS
+        table = connection.ops.quote_name(PlayerBoardMarking._meta.db_table)
+        # The marking is read (and locked, where the database can) before it is updated, so that
+        #  whether it had been announced before this mark comes back from the same statement.
+        #  MATERIALIZED and RETURNING need PostgreSQL 12 or SQLite 3.35 or later. Only PostgreSQL
+        #  needs the lock, since SQLite runs one write at a time anyway.
+        lock = " FOR UPDATE" if connection.features.has_select_for_update else ""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH old AS MATERIALIZED ("
+                f"SELECT id, announced FROM {table} WHERE player_board_id = %s AND space_id = %s"
+                f"{lock})"
+                f" UPDATE {table} SET"
+                f" color = COALESCE(%s, color),"
+                f" covert_marked = COALESCE(%s, covert_marked),"
+                f" marked_by_player = (marked_by_player OR %s),"
+                f" announced = (announced OR %s)"
+                f" WHERE id = (SELECT id FROM old)"
+                f" AND (%s OR NOT marked_by_player)"
+                f" AND (color <> COALESCE(%s, color)"
+                f" OR covert_marked <> COALESCE(%s, covert_marked) OR %s)"
+                f" RETURNING id, color, covert_marked, marked_by_player, announced,"
+                f" auto_marker_client_id, (SELECT announced FROM old)",
+                [player_board_id, space_id, to_state, covert_marked, player_marked,
+                 announced_color, as_player, to_state, covert_marked, player_marked]
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None, False
+
+        marking = PlayerBoardMarking(
+            id=row[0], player_board_id=player_board_id, space_id=space_id, color=row[1],
+            covert_marked=bool(row[2]), marked_by_player=bool(row[3]), announced=bool(row[4]),
+            auto_marker_client_id=row[5],
+        )
+        # Of several concurrent marks, only the one that sets `announced` announces
+        announce = announced_color and not row[6]
+        return marking, announce
@@ -1,27 +1,79 @@
 from django.db import models
 
+from backend.models.board_shape import BoardShape
 from backend.models.color import Color
-from generation.goals import ConcreteGoal
+from generation.goals import ConcreteGoal, GOAL_TYPE_NEGATIVE
 
 
 class Space(models.Model):
     id = models.AutoField(primary_key=True)
     board = models.ForeignKey('Board', on_delete=models.CASCADE)
-    position = models.OneToOneField('Position', on_delete=models.CASCADE)
+
+    x = models.IntegerField()
+    y = models.IntegerField()
+    """
+    Where this space is on the board.
+
+    For `square` boards, the position in the upper left of the board is represented as (x = y = 0).
+    Each space to the right increments `x` by 1, and down `y`.
+
+    For `hexagon` boards, positions are stored as `axial coordinates with x=q and y=r
+    <https://www.redblobgames.com/grids/hexagons/#coordinates-axial>`_. The upper left is
+    represented as (x = y = 0). Each space to the right increments `x` by 1. Each space down and to
+    the right increments `y` by 1. This makes it possible for coordinates to be negative. However,
+    all coordinates must be no further above or to the left of (0, 0).
+    """
 
     goal_id = models.SlugField(max_length=256)
 
+    # The goal rendered with this space's variables, so that boards can be serialized without
+    #  looking up goals or their variables. Kept up to date with `goals.yml` by the `rendergoals`
+    #  management command.
+    text = models.TextField(default='')
+    tooltip = models.TextField(default='')
+    goal_type = models.CharField(max_length=64, default='default')
+    variables = models.JSONField(default=dict)
+    """
+    Copy of this space's `SetVariable` objects as a dict of name to value.
+    """
+
     def __str__(self):
-        return str(self.board) + " @" + str(self.position)
+        if self.board.shape == BoardShape.HEXAGON:
+            return str(self.board) + " @" + str((self.x, self.y, self.z()))
+        else:
+            return str(self.board) + " @" + str((self.x, self.y))
 
     class Meta:
         ...
         # unique_together = ['board']
         # TODO uniqueness validation for spaces
 
-    def initial_state(self):
-        cg = ConcreteGoal.from_space(self)
-        if cg.template.type == 'negative':
+    def z(self) -> int:
+        """
+        Get the implied z coordinate of this space if it is on a hexagonal board. By the definition
+        of `axial coordinates <https://www.redblobgames.com/grids/hexagons/#coordinates-axial>`_,
+        the x, y, and z coordinates must add to 0. The board's shape is not checked, so this is
+        meaningless for spaces on other shapes of board.
+        :return: This space's z coordinate
+        """
+        return -self.x - self.y
+
+    def render_goal(self, goal: ConcreteGoal):
+        """
+        Set this space's goal and the fields rendered from it, without saving.
+        """
+        self.goal_id = goal.template.id
+        self.text = goal.description()
+        self.tooltip = goal.tooltip()
+        self.goal_type = goal.template.type
+        self.variables = goal.variables
+
+    @staticmethod
+    def initial_state_of_goal_type(goal_type: str):
+        """
+        Get the color that a space starts out as, which only depends on the type of its goal.
+        """
+        if goal_type == GOAL_TYPE_NEGATIVE:
             return Color.NOT_INVALIDATED
         else:
             return Color.UNMARKED
@@ -0,0 +1,96 @@
+"""
+Merges the disconnects of players from a game that happen close together (such as every socket
+disconnecting at once when the server restarts or its proxy reloads), so that they are written to
+the database with one query and announced with one pboards broadcast, rather than one of each for
+every player.
+
+Disconnects are merged over the same window as broadcasts (see `broadcast_coalescing`), and are
+not written for players who have connected again since (see `PlayerBoard.connected_at`), even to
+another process. That compares the clocks of the two processes, so they should be kept in sync.
+Reconnects are not delayed, since the player needs to be sent the game right away, but their
+pboards broadcasts are merged by `broadcast_coalescing` as usual. Games kept in memory do not need
+this, since their changes are already written in batches.
+"""
+import asyncio
+import atexit
+import traceback
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Tuple
+
+from channels.db import database_sync_to_async
+from django.db.models import Case, DateTimeField, Q, Value, When
+from django.utils import timezone
+
+from backend.broadcast_coalescing import coalesce
+from backend.models.player_board import PlayerBoard
+
+_PENDING: Dict[str, Dict[str, Tuple[int, datetime]]] = {}
+"""
+Player board IDs and times of the disconnects that have not been written yet, by game code, then
+by player name.
+"""
+_WRITING: Dict[str, asyncio.Future] = {}
+
+
+async def disconnected(game_code: str, player_name: str, player_board_id: int,
+                       broadcast: Callable[[], Awaitable]):
+    """
+    Mark a player as disconnected soon, along with any other players of the same game who
+    disconnect around the same time.
+    :param broadcast: Coroutine function that broadcasts the player boards, which is called once
+                      the disconnects have been written.
+    """
+    _PENDING.setdefault(game_code, {})[player_name] = (player_board_id, timezone.now())
+
+    async def write_and_broadcast():
+        await _write(game_code)
+        await broadcast()
+
+    await coalesce(game_code, 'roster', write_and_broadcast)
+
+
+async def reconnected(game_code: str, player_name: str):
+    """
+    Forget the disconnect of a player who has reconnected, if it has not been written yet. If it is
+    being written, wait for that to finish so that it cannot overwrite the reconnect.
+    """
+    _PENDING.get(game_code, {}).pop(player_name, None)
+
+    writing = _WRITING.get(game_code)
+    if writing:
+        await asyncio.shield(writing)
+
+
+async def _write(game_code: str):
+    disconnects = _PENDING.pop(game_code, None)
+    if not disconnects:
+        return
+
+    writing = asyncio.ensure_future(database_sync_to_async(_write_disconnects)(disconnects))
+    _WRITING[game_code] = writing
+    try:
+        await writing
+    finally:
+        if _WRITING.get(game_code) is writing:
+            del _WRITING[game_code]
+
+
+def _write_disconnects(disconnects: Dict[str, Tuple[int, datetime]]):
+    disconnected_at = Case(
+        *(When(pk=pk, then=Value(at)) for pk, at in disconnects.values()),
+        output_field=DateTimeField()
+    )
+    PlayerBoard.objects\
+        .filter(pk__in=[pk for pk, _ in disconnects.values()])\
+        .filter(Q(connected_at=None) | Q(connected_at__lt=disconnected_at))\
+        .update(disconnected_at=disconnected_at)
+
+
+@atexit.register
+def _write_all_on_exit():
+    for game_code in list(_PENDING):
+        try:
+            _write_disconnects(_PENDING.pop(game_code))
+        except Exception:
+            print(f"Failed to save disconnects from game {game_code} on exit:")
+            traceback.print_exc()
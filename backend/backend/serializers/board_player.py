@@ -1,12 +1,12 @@
-from typing import Optional
+from typing import Optional, Iterable
 
 from rest_framework import serializers
 
 from backend.models.board import Board
+from backend.models.player_board import PlayerBoard
 from backend.models.player_board_marking import PlayerBoardMarking
 from backend.models.space import Space
 from backend.serializers.position import PositionSerializer
-from generation.goals import ConcreteGoal
 
 
 # noinspection PyMethodMayBeStatic
@@ -16,17 +16,9 @@ class SpacePlayerSerializer(serializers.ModelSerializer):
         fields = ['space_id', 'position', 'text', 'tooltip', 'auto']
 
     space_id = serializers.IntegerField(source='pk')
-    position = PositionSerializer()
-    text = serializers.SerializerMethodField()
-    tooltip = serializers.SerializerMethodField()
+    position = PositionSerializer(source='*')
     auto = serializers.SerializerMethodField()
 
-    def get_text(self, obj):
-        return ConcreteGoal.from_space(obj).description()
-
-    def get_tooltip(self, obj):
-        return ConcreteGoal.from_space(obj).tooltip()
-
     def get_auto(self, obj):
         markings = self.context.get('player_board_markings')
         return obj.pk in (
@@ -43,9 +35,13 @@ class BoardPlayerSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def from_id(board_id: int, player_board_id: Optional[int]):
-        board = Board.objects.prefetch_related('space_set__position')\
-            .prefetch_related('space_set__setvariable_set').get(pk=board_id)
-        markings = PlayerBoardMarking.objects.filter(
-            player_board__board_id=board_id, player_board_id=player_board_id
-        )
-        return BoardPlayerSerializer(board, context={'player_board_markings': markings}).data
+        board = Board.objects.prefetch_related('space_set').get(pk=board_id)
+        player_board = PlayerBoard.objects.filter(board_id=board_id, pk=player_board_id).first()
+        markings = player_board.get_markings(with_automarks=True) if player_board else []
+        return BoardPlayerSerializer.from_board(board, markings)
+
+    @staticmethod
+    def from_board(board: Board, player_board_markings: Iterable[PlayerBoardMarking]):
+        return BoardPlayerSerializer(board, context={
+            'player_board_markings': player_board_markings
+        }).data
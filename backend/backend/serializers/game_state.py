@@ -0,0 +1,14 @@
+from backend.models.color import Color
+from backend.models.space import Space
+
+
+def marking_announcement(player_name: str, space: Space, to_state: int) -> dict:
+    """
+    Get the `game_state` announcement for a player completing or invalidating a space.
+    """
+    return {
+        'state': 'marking',
+        'marking_type': 'invalidate' if Color(to_state) == Color.INVALIDATED else 'complete',
+        'player': player_name,
+        'goal': space.text,
+    }
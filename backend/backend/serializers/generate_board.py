@@ -1,7 +1,7 @@
 from rest_framework import serializers
 
 from backend.models.board import Board
-from generation.board_generator import generate_board
+from generation.board_pool import claim_or_generate_board
 
 
 class GenerateBoardSerializer(serializers.ModelSerializer):
@@ -16,7 +16,7 @@ class GenerateBoardSerializer(serializers.ModelSerializer):
                                          child=serializers.CharField(max_length=256))
 
     def create(self, validated_data):
-        return generate_board(**validated_data)
+        return claim_or_generate_board(**validated_data)
 
     def update(self, instance, validated_data):
         raise NotImplementedError("Cannot update a GenerateBoardSerializer.")
@@ -1,10 +1,12 @@
-from datetime import timedelta
-from typing import Optional
+import json
+from typing import Optional, List, Iterable, Dict
 
 from django.db.models import Q
 from django.utils import timezone
 from rest_framework import serializers
 
+from backend.active_roster import DISCONNECTED_TIMEOUT
+from backend.models.board import Board
 from backend.models.player_board import PlayerBoard
 from backend.models.player_board_marking import PlayerBoardMarking
 from win_detection.win_detection import winning_space_ids
@@ -30,24 +32,122 @@ class PlayerBoardSerializer(serializers.ModelSerializer):
         fields = ['player_id', 'player_name', 'markings', 'win', 'disconnected_at']
 
     player_id = serializers.IntegerField(source='pk')
-    markings = PlayerBoardMarkingSerializer(many=True, source='playerboardmarking_set')
+    markings = PlayerBoardMarkingSerializer(many=True, source='get_markings')
     win = serializers.SerializerMethodField()
 
     def get_win(self, obj: PlayerBoard):
+        wins = self.context.get('wins')
+        if wins is not None:
+            return wins.get(obj.pk)
         return winning_space_ids(obj)
 
     @staticmethod
-    def from_board_id(board_id: int, for_player_pboard_id: Optional[int] = None):
-        # Only collects board states of players who are not disconnected
-        recent_dc_time = timezone.now() - timedelta(minutes=1)
+    def render_shared(board_id: int) -> dict:
+        """
+        Render the player boards of a game once, so that the result can be carried in a group
+        message and delivered to every consumer in the game without re-rendering.
+
+        The shared text is the spectator view, in which no covert markings are visible. Players who
+        have covert markings additionally get their own entry rendered with those markings visible,
+        which is swapped into the shared list by `text_for_recipient`.
+        :return: A dict (safe to send over the channel layer) with the keys `version`, `text`,
+                 `fragments`, and `covert`.
+        """
+        # Read the version before the markings. If a marking changes in between, the snapshot is
+        #  newer than its version claims, which is harmless because patches are idempotent.
+        version = Board.objects.values_list('version', flat=True).get(pk=board_id)
+
+        # Only collects board states of players who are on the roster
+        recent_dc_time = timezone.now() - DISCONNECTED_TIMEOUT
 
         pboards = PlayerBoard.objects.select_related('board').prefetch_related('playerboardmarking_set').filter(
             Q(disconnected_at=None) | Q(disconnected_at__gt=recent_dc_time),
             board_id=board_id
         ).order_by('pk')
 
+        return PlayerBoardSerializer.render_shared_from(pboards, version)
+
+    @staticmethod
+    def render_shared_from(pboards: Iterable[PlayerBoard], version: int,
+                           wins: Dict[int, Optional[List[int]]] = None) -> dict:
+        """
+        Same as `render_shared`, but for player boards that have already been loaded along with
+        their markings.
+        :param wins: Winning space IDs by player board ID, if already known.
+        """
+        fragments = []
+        covert = []
+        for index, pboard in enumerate(pboards):
+            data = PlayerBoardSerializer(pboard, context={'wins': wins}).data
+            fragments.append(json.dumps(data))
+
+            # Only the markings need re-rendering to show a player their own covert markings
+            markings = pboard.get_markings()
+            if any(m.covert_marked for m in markings):
+                data['markings'] = PlayerBoardMarkingSerializer(markings, many=True, context={
+                    'for_player_pboard_id': pboard.pk
+                }).data
+                covert.append([pboard.pk, index, json.dumps(data)])
+
         return {
-            'pboards': PlayerBoardSerializer(pboards, many=True, context={
-                'for_player_pboard_id': for_player_pboard_id
-            }).data
+            'version': version,
+            'text': _join_fragments(fragments, version),
+            'fragments': fragments,
+            'covert': covert,
         }
+
+    @staticmethod
+    def text_for_recipient(rendered: dict, for_player_pboard_id: Optional[int] = None) -> str:
+        """
+        Get the JSON text that should be sent to a single consumer from the output of
+        `render_shared`.
+        :param for_player_pboard_id: Player board ID of the recipient, whose own covert markings
+                                     are visible to them. None for spectators and plugins.
+        """
+        for pboard_id, index, fragment in rendered['covert']:
+            if pboard_id == for_player_pboard_id:
+                fragments = list(rendered['fragments'])
+                fragments[index] = fragment
+                return _join_fragments(fragments, rendered['version'])
+
+        return rendered['text']
+
+    @staticmethod
+    def text_for_hello(rendered: dict, board: dict, for_player_pboard_id: int) -> str:
+        """
+        Get the JSON text of the `hello` message that a player is sent when they connect, which
+        carries their board along with the output of `render_shared`.
+        """
+        pboards_text = PlayerBoardSerializer.text_for_recipient(rendered, for_player_pboard_id)
+        # Splice in the keys of the pboards message rather than parsing it again
+        return '{"hello": {"board": ' + json.dumps(board) + ', ' + pboards_text[1:] + '}'
+
+    @staticmethod
+    def render_patch(marking: PlayerBoardMarking, win: Optional[List[int]], version: int) -> dict:
+        """
+        Render the change of a single marking as an incremental update to the player boards.
+        Clients apply patches in `version` order on top of the last full `pboards` they received.
+        """
+        return {
+            'version': version,
+            'player_id': marking.player_board_id,
+            'space_id': marking.space_id,
+            'color': marking.color,
+            'covert_marked': marking.covert_marked,
+            'marked_by_player': marking.marked_by_player,
+            'win': win,
+        }
+
+    @staticmethod
+    def text_for_recipient_patch(patch: dict, for_player_pboard_id: Optional[int] = None) -> str:
+        """
+        Get the JSON text that should be sent to a single consumer from the output of
+        `render_patch`, hiding the covert marking from everyone but the player it belongs to.
+        """
+        if patch['player_id'] != for_player_pboard_id:
+            patch = dict(patch, covert_marked=False)
+        return json.dumps({'pboard_patch': patch})
+
+
+def _join_fragments(fragments, version: int) -> str:
+    return '{"pboards": [' + ', '.join(fragments) + '], "version": ' + str(version) + '}'
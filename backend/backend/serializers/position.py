@@ -1,9 +1,9 @@
 from rest_framework import serializers
 
-from backend.models.position import Position
 
-
-class PositionSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Position
-        fields = ['x', 'y']
+class PositionSerializer(serializers.Serializer):
+    """
+    The `x` and `y` of a Space, as an object of their own. Use with `source='*'`.
+    """
+    x = serializers.IntegerField()
+    y = serializers.IntegerField()
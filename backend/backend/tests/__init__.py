@@ -0,0 +1,4 @@
+"""
+Run from the directory that contains manage.py with `python manage.py test -t .`, since that
+directory is itself a package.
+"""
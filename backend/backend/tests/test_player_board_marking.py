@@ -0,0 +1,79 @@
+from itertools import product
+
+from django.test import TestCase, override_settings
+
+from backend.models.board import Board
+from backend.models.board_shape import BoardShape
+from backend.models.color import Color
+from backend.models.player_board import PlayerBoard
+from backend.models.player_board_marking import PlayerBoardMarking
+from backend.models.space import Space
+
+MARKS = list(product([None] + list(Color), [None, False, True], [False, True]))
+"""Every (to_state, covert_marked, as_player) that a marking can be marked with."""
+
+FIELDS = ['color', 'covert_marked', 'marked_by_player', 'announced']
+
+
+@override_settings(PACK_PLAYER_BOARD_MARKINGS=False)
+class MarkTest(TestCase):
+    """
+    `PlayerBoardMarking.mark` makes the same changes as `apply_mark`, but in the database.
+    """
+
+    def setUp(self):
+        board = Board.objects.create(game_code='test', shape=BoardShape.SQUARE)
+        self.space = Space.objects.create(board=board, x=0, y=0, goal_id='test')
+        self.pboard = PlayerBoard.objects.create(board=board, player_name='test')
+
+    def test_every_pair_of_marks(self):
+        for first, second in product(MARKS, repeat=2):
+            with self.subTest(first=first, second=second):
+                self._reset()
+                expected = PlayerBoardMarking(color=Color.UNMARKED)
+                for mark in (first, second):
+                    self._assert_same_mark(expected, mark)
+
+    def test_player_mark_blocks_admin(self):
+        expected = PlayerBoardMarking(color=Color.UNMARKED)
+        for mark in [(Color.COMPLETE, None, True), (Color.UNMARKED, None, False),
+                     (Color.INVALIDATED, None, False), (Color.UNMARKED, None, True)]:
+            self._assert_same_mark(expected, mark)
+        self.assertEqual(self._marking().color, Color.UNMARKED)
+
+    def test_repeated_mark_does_not_change(self):
+        self._assert_same_mark(PlayerBoardMarking(color=Color.UNMARKED),
+                               (Color.COMPLETE, None, False))
+        marking, announce = self._mark((Color.COMPLETE, None, False))
+        self.assertIsNone(marking)
+        self.assertFalse(announce)
+
+    def test_announces_once(self):
+        announcements = [self._mark((color, None, False))[1] for color in
+                         [Color.COMPLETE, Color.UNMARKED, Color.COMPLETE, Color.INVALIDATED]]
+        self.assertEqual(announcements, [True, False, False, False])
+
+    def _assert_same_mark(self, expected: PlayerBoardMarking, mark):
+        changed, expected_announce = expected.apply_mark(*mark)
+        marking, announce = self._mark(mark)
+        self.assertEqual(marking is not None, changed)
+        self.assertEqual(announce, expected_announce)
+        if marking is not None:
+            self.assertEqual(_fields(marking), _fields(expected))
+        self.assertEqual(_fields(self._marking()), _fields(expected))
+
+    def _mark(self, mark):
+        to_state, covert_marked, as_player = mark
+        return PlayerBoardMarking.mark(self.pboard.pk, self.space.pk, to_state, covert_marked,
+                                       as_player)
+
+    def _marking(self) -> PlayerBoardMarking:
+        return PlayerBoardMarking.objects.get(player_board=self.pboard, space=self.space)
+
+    def _reset(self):
+        PlayerBoardMarking.objects.filter(player_board=self.pboard).update(
+            color=Color.UNMARKED, covert_marked=False, marked_by_player=False, announced=False)
+
+
+def _fields(marking: PlayerBoardMarking):
+    return {field: getattr(marking, field) for field in FIELDS}
@@ -4,6 +4,18 @@
 echo "Apply database migrations"
 python ./manage.py migrate
 
+# Render the goals of spaces created before they were stored on spaces
+echo "Render goals"
+python ./manage.py rendergoals --unrendered
+
+# Build the tables that hexagon boards are checked for wins with
+echo "Build win tables"
+python ./manage.py buildwintables
+
+# Generate boards ahead of time, so that the first new games do not wait for one to be generated
+echo "Fill board pool"
+python ./manage.py fillboardpool
+
 # Start server
 echo "Starting server"
 daphne -b 0.0.0.0 -p 8000 MultiBingo.asgi:application
@@ -1,13 +1,13 @@
 import random
 import string
+import uuid
 from typing import List
 
 from django.db import transaction
 from rest_framework.exceptions import ValidationError
 
-from backend.models.board_shape import BoardShape
+from backend.models.board_shape import BoardShape, get_positions
 from backend.models.board import Board
-from backend.models.position import Position
 from backend.models.space import Space
 from backend.models.set_variable import SetVariable
 from win_detection.win_detection import get_win_detector, get_default_win_detector
@@ -19,7 +19,8 @@ def generate_board(game_code: str = None,
                    shape: BoardShape = BoardShape.HEXAGON,
                    win_detector: str = None,
                    seed: str = None,
-                   forced_goals: List[str] = None) -> Board:
+                   forced_goals: List[str] = None,
+                   pooled: bool = False) -> Board:
     """
     Generate a board and all spaces with the given parameters.
     :param game_code: Unique identifier for the board, or None for a random string.
@@ -28,55 +29,61 @@ def generate_board(game_code: str = None,
                          default.
     :param seed: Seed to use in generation, or None to use a random seed.
     :param forced_goals: List of goal IDs that will be forced to be on the board.
+    :param pooled: Whether this board is going into the pool of boards waiting to be claimed, in
+                   which case it gets a placeholder game code.
     :return: The newly created Board instance.
     """
-    game_code = game_code or _get_random_game_code()
-    # TODO: In theory, game_code could be randomized to one that already exists. This would cause
-    #       the response to be a 400 most likely.
+    if pooled:
+        game_code = uuid.uuid4().hex
+    else:
+        game_code = game_code or get_random_game_code()
     rand = random.Random(seed)
     easy_proportion = rand.uniform(0.25, 0.4)  # Proportion of goals on the board that are easier
 
-    if win_detector:
-        wd_func = get_win_detector(win_detector)
-        if shape not in wd_func.board_shapes:
-            raise ValidationError("Win detector incompatible with board shape")
-    else:
-        wd_func = get_default_win_detector(shape)
-    win_detector = wd_func.__name__
+    win_detector = resolve_win_detector(shape, win_detector)
 
-    board = Board.objects.create(game_code=game_code, shape=shape, win_detector=win_detector)
+    board = Board.objects.create(game_code=game_code, shape=shape, win_detector=win_detector,
+                                 pooled=pooled)
 
-    positions = _get_positions(shape)
+    positions = get_positions(shape)
     goals = get_goals(rand, len(positions), easy_proportion, forced_goals=forced_goals)
-    for pos, goal in zip(positions, goals):
-        pos.save()
-        spc = Space.objects.create(board=board, position=pos, goal_id=goal.template.id)
-        for variable_name, variable_value in goal.variables.items():
-            SetVariable.objects.create(space=spc, name=variable_name, value=variable_value)
+    # Relies on the database returning the primary keys of bulk inserted rows (PostgreSQL, or
+    #  SQLite 3.35+) to link each insert to the previous one
+    spaces = [Space(board=board, x=x, y=y) for (x, y) in positions]
+    for spc, goal in zip(spaces, goals):
+        spc.render_goal(goal)
+    Space.objects.bulk_create(spaces)
+    SetVariable.objects.bulk_create([
+        SetVariable(space=spc, name=variable_name, value=variable_value)
+        for spc, goal in zip(spaces, goals)
+        for variable_name, variable_value in goal.variables.items()
+    ])
 
-    print(f"Created a new {shape} board {game_code}")
+    if not pooled:
+        print(f"Created a new {shape} board {game_code}")
     return board
 
 
-def _get_positions(shape: BoardShape):
+def resolve_win_detector(shape: BoardShape, win_detector: str = None) -> str:
     """
-    Get a list of positions for the spaces on this board.
-    :param shape: Shape of the board, square or heagon.
-    :return: A list of Position objects that are NOT saved to the database.
+    Get the name of the win detector that a new board will use.
+    :param win_detector: Requested win detector, or None to use the board shape default.
+    :raises ValidationError: if the requested win detector cannot be used with the board shape.
     """
-    if shape == BoardShape.HEXAGON:
-        positions = [
-            (1, 0), (2, 0), (3, 0), (4, 0),
-            (0, 1), (1, 1), (2, 1), (3, 1), (4, 1),
-            (-1, 2), (0, 2), (1, 2), (2, 2), (3, 2), (4, 2),
-            (-1, 3), (0, 3), (1, 3), (2, 3), (3, 3),
-            (-1, 4), (0, 4), (1, 4), (2, 4),
-        ]
+    if win_detector:
+        wd_func = get_win_detector(win_detector)
+        if shape not in wd_func.board_shapes:
+            raise ValidationError("Win detector incompatible with board shape")
     else:
-        positions = [((i % 5), (i // 5)) for i in range(25)]
-
-    return [Position(x=x, y=y) for (x, y) in positions]
+        wd_func = get_default_win_detector(shape)
+    return wd_func.__name__
 
 
-def _get_random_game_code():
-    return ''.join(random.choices(string.ascii_uppercase, k=6))
+def get_random_game_code():
+    """
+    Get a random game code that is not used by any existing board.
+    """
+    while True:
+        game_code = ''.join(random.choices(string.ascii_uppercase, k=6))
+        if not Board.objects.filter(game_code=game_code).exists():
+            return game_code
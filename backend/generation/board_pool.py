@@ -0,0 +1,124 @@
+"""
+Boards that are generated ahead of time, so that creating a new game only has to claim one by
+renaming its game code instead of generating a board while the player waits.
+
+The pool keeps `BOARD_POOL_SIZE` unclaimed boards for each combination of shape and win detector
+that has been asked for. Claimed boards are replaced in the background by a single worker thread.
+The `fillboardpool` command fills the pools of the default combinations when the server starts, so
+that the first games after a deploy do not have to wait either.
+Boards with a seed or forced goals cannot come from the pool, and are always generated on demand.
+"""
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Subquery
+
+from backend.models.board import Board
+from backend.models.board_shape import BoardShape
+from generation.board_generator import generate_board, get_random_game_code, resolve_win_detector
+
+CLAIM_ATTEMPTS = 3
+"""Number of times to try claiming a board when other claims keep taking the same one first."""
+
+_REFILL_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='board-pool')
+_REFILLS_QUEUED = set()  # type: Set[Tuple[str, str]]
+_REFILLS_QUEUED_LOCK = threading.Lock()
+
+
+def claim_or_generate_board(game_code: str = None,
+                            shape: BoardShape = BoardShape.HEXAGON,
+                            win_detector: str = None,
+                            seed: str = None,
+                            forced_goals: List[str] = None) -> Board:
+    """
+    Get a new board with the given parameters, taking it from the pool if possible. Accepts the
+    same parameters as `generate_board`.
+    :return: The new Board instance.
+    """
+    if seed is not None or forced_goals or settings.BOARD_POOL_SIZE <= 0:
+        return generate_board(game_code, shape, win_detector, seed, forced_goals)
+
+    win_detector = resolve_win_detector(shape, win_detector)
+    game_code = game_code or get_random_game_code()
+
+    board = _claim(game_code, shape, win_detector)
+    # Refill only after this claim is committed, so that the claimed board is not counted
+    transaction.on_commit(lambda: _refill_soon(shape, win_detector))
+
+    if board is None:
+        return generate_board(game_code, shape, win_detector)
+
+    print(f"Claimed a pooled {shape} board for {game_code}")
+    return board
+
+
+def _claim(game_code: str, shape: BoardShape, win_detector: str) -> Optional[Board]:
+    """
+    Take a board out of the pool by renaming it.
+    :return: The claimed board, or None if the pool is empty.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        unclaimed = Board.objects.filter(pooled=True, shape=shape, win_detector=win_detector)
+        # Checking `pooled` again makes this a no-op if another claim takes the same board first
+        claimed = Board.objects.filter(
+            pk__in=Subquery(unclaimed.values('pk')[:1]), pooled=True
+        ).update(game_code=game_code, pooled=False)
+
+        if claimed:
+            return Board.objects.get(game_code=game_code)
+        if not unclaimed.exists():
+            return None
+
+    return None
+
+
+def fill(shape: BoardShape, win_detector: str):
+    """
+    Generate boards until the pool of a shape and win detector has `BOARD_POOL_SIZE` unclaimed
+    boards.
+    :return: The number of boards generated.
+    """
+    unclaimed = Board.objects.filter(pooled=True, shape=shape, win_detector=win_detector)
+    missing = max(settings.BOARD_POOL_SIZE - unclaimed.count(), 0)
+    for _ in range(missing):
+        generate_board(shape=shape, win_detector=win_detector, pooled=True)
+    return missing
+
+
+def pooled_combinations() -> Set[Tuple[str, str]]:
+    """
+    :return: The default (shape, win detector) of each shape, and every other combination that has
+             unclaimed boards in the pool.
+    """
+    combinations = set((shape.value, resolve_win_detector(shape)) for shape in BoardShape)
+    combinations.update(Board.objects.filter(pooled=True).values_list('shape', 'win_detector')
+                        .distinct())
+    return combinations
+
+
+def _refill_soon(shape: BoardShape, win_detector: str):
+    key = (shape, win_detector)
+    with _REFILLS_QUEUED_LOCK:
+        if key in _REFILLS_QUEUED:
+            return
+        _REFILLS_QUEUED.add(key)
+    _REFILL_EXECUTOR.submit(_refill, shape, win_detector)
+
+
+def _refill(shape: BoardShape, win_detector: str):
+    with _REFILLS_QUEUED_LOCK:
+        # Claims from here on may not be counted below, so they need to queue another refill
+        _REFILLS_QUEUED.discard((shape, win_detector))
+
+    try:
+        fill(shape, win_detector)
+    except Exception:
+        print(f"Failed to refill the pool of {shape} boards with {win_detector}:")
+        traceback.print_exc()
+    finally:
+        # Only closes the connections of this worker thread
+        connections.close_all()
@@ -0,0 +1,16 @@
+from typing import Dict, Tuple
+
+
+class BoardGeometry:
+    """
+    The layout of a board's spaces, which is all that win detectors need to know about a board.
+    Spaces are in order of position, which is also the order of a player's colors (see
+    `PlayerBoard.get_colors`). Built once for each board (see `board_geometry`), so detectors can
+    cache what they work out from it.
+    """
+    def __init__(self, space_ids: Tuple[int, ...], positions: Tuple[Tuple[int, int], ...]):
+        self.space_ids = space_ids
+        self.positions = positions
+        """(x, y) coordinates of each space, as described in `Space`."""
+        self.index = {space_id: i for i, space_id in enumerate(space_ids)}  # type: Dict[int, int]
+        """Index of each space in order, by ID."""
@@ -6,14 +6,31 @@ WIN_DETECTORS = []
 def win_detector(friendly_name: str, board_shapes: List = None):
     """
     Usage: decorate a win detection function with this decorator. Detector function will receive
-    a PlayerBoard object and should return either a list of spaces that constitute a "win", or None
-    if this board is not a winner.
+    the board's BoardGeometry and the color of each of a player's markings in the same order, and
+    should return either a list of the IDs of the spaces that constitute a "win", or None if this
+    board is not a winner.
 
     Don't forget to add the new win detector to __init__ so that it is imported/discovered.
     """
     def inner(func):
         func.friendly_name = friendly_name
         func.board_shapes = board_shapes
+        func.incremental = None
         WIN_DETECTORS.append(func)
         return func
     return inner
+
+
+def incremental_win_detector(detector):
+    """
+    Usage: decorate a function that finds the win of `detector` after only one space of a board has
+    changed, by checking only the wins that could include that space. Function will receive the
+    same as `detector`, followed by the ID of the changed space and the IDs of the spaces that made
+    up the board's win before the change (or None), and should return the same as `detector`.
+
+    `detector` is still used wherever the previous win is not known.
+    """
+    def inner(func):
+        detector.incremental = func
+        return func
+    return inner
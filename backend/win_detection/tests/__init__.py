@@ -0,0 +1,4 @@
+"""
+Each detector is compared with a plain search over positions, like the one that it replaced, on
+random boards, so that changes to the masks and tables that detectors precompute are caught.
+"""
@@ -0,0 +1,63 @@
+import random
+from typing import Optional, Sequence, Set
+
+from django.test import SimpleTestCase
+
+from backend.models.board_shape import BoardShape, get_positions
+from backend.models.color import Color
+from win_detection.board_geometry import BoardGeometry
+from win_detection.wd_bingo_standard import BOARD_SIZE, bingo_standard
+from win_detection.winning_markings import WINNING_MARKINGS
+
+BOARDS = 5000
+MARKS = 5000
+
+
+def _reference_win(geometry: BoardGeometry, colors: Sequence[int]) -> Set[int]:
+    """
+    IDs of the spaces in complete lines, found the way the detector used to.
+    """
+    spaces = list(zip(geometry.space_ids, geometry.positions, colors))
+    lines = [[s for s in spaces if s[1][1] == i] for i in range(BOARD_SIZE)]
+    lines += [[s for s in spaces if s[1][0] == i] for i in range(BOARD_SIZE)]
+    lines.append([s for s in spaces if s[1][0] == s[1][1]])
+    lines.append([s for s in spaces if s[1][0] == BOARD_SIZE - 1 - s[1][1]])
+
+    winning = set()
+    for line in lines:
+        if all(color in WINNING_MARKINGS for _, _, color in line):
+            winning.update(space_id for space_id, _, _ in line)
+    return winning
+
+
+class BingoStandardTest(SimpleTestCase):
+    def setUp(self):
+        self.random = random.Random(0)
+        positions = tuple(get_positions(BoardShape.SQUARE))
+        self.geometry = BoardGeometry(tuple(range(100, 100 + len(positions))), positions)
+
+    def test_matches_reference(self):
+        for _ in range(BOARDS):
+            colors = self._random_colors()
+            self._assert_matches(bingo_standard(self.geometry, colors), colors)
+
+    def test_incremental_matches_reference(self):
+        colors = self._random_colors()
+        win = bingo_standard(self.geometry, colors)
+        for _ in range(MARKS):
+            index = self.random.randrange(len(colors))
+            colors[index] = self.random.choice(list(Color))
+            win = bingo_standard.incremental(self.geometry, colors,
+                                             self.geometry.space_ids[index], win)
+            self._assert_matches(win, colors)
+
+    def _assert_matches(self, win: Optional[Sequence[int]], colors: Sequence[int]):
+        self.assertEqual(set(win or ()), _reference_win(self.geometry, colors))
+        self.assertNotEqual(win, [])
+
+    def _random_colors(self):
+        # Mostly marked, since few random boards would have a whole line otherwise
+        density = self.random.uniform(0.5, 0.9)
+        return [self.random.choice(WINNING_MARKINGS) if self.random.random() < density
+                else self.random.choice([Color.UNMARKED, Color.REVERTED, Color.INVALIDATED])
+                for _ in self.geometry.space_ids]
@@ -0,0 +1,141 @@
+import random
+import tempfile
+from functools import lru_cache
+from typing import FrozenSet, Optional, Sequence, Tuple
+
+from django.test import SimpleTestCase, override_settings
+
+from backend.models.board_shape import BoardShape, get_positions
+from backend.models.color import Color
+from win_detection import win_table
+from win_detection.board_geometry import BoardGeometry
+from win_detection.wd_hex_snake import DEPTH_LIMIT, WIN_LENGTH, build_win_tables, hex_snake, \
+    hex_snake_neighborless
+from win_detection.winning_markings import WINNING_MARKINGS
+
+Position = Tuple[int, int]
+
+BOARDS = 1500
+MARKS = 1500
+
+
+def _reference_wins(positions: FrozenSet[Position], allow_neigh: bool) -> bool:
+    """
+    Whether marked `positions` make a chain, searched for the way the detectors used to.
+    """
+    return len(_reference_longest_chain((), positions, allow_neigh)) >= WIN_LENGTH
+
+
+@lru_cache(maxsize=10000)
+def _reference_longest_chain(current: Tuple[Position, ...], candidates: FrozenSet[Position],
+                             allow_neigh: bool) -> Tuple[Position, ...]:
+    if len(current) == 0:
+        next_node_choices = candidates
+    elif allow_neigh or len(current) < 2:
+        next_node_choices = _reference_neighbors(current[-1], candidates)
+    else:
+        next_node_choices = _reference_neighbors(current[-1], candidates) \
+            - _reference_neighbors(current[-2], candidates)
+
+    if len(current) >= DEPTH_LIMIT:
+        return current
+
+    longest_chain = current
+    for neigh in next_node_choices:
+        longest_from = _reference_longest_chain(current + (neigh,), candidates - {neigh},
+                                                allow_neigh)
+        if len(longest_from) > len(longest_chain):
+            longest_chain = longest_from
+        if len(longest_chain) >= DEPTH_LIMIT:
+            break
+    return longest_chain
+
+
+def _reference_neighbors(of: Position, candidates: FrozenSet[Position]) -> FrozenSet[Position]:
+    return frozenset(other for other in candidates if _reference_is_neighbor(of, other))
+
+
+def _reference_is_neighbor(left: Position, right: Position) -> bool:
+    # Axial coordinates, with the implied z coordinate of `Space.z`
+    if left[0] == right[0]:
+        return abs(left[1] - right[1]) == 1
+    if left[1] == right[1]:
+        return abs(-left[0] - left[1] - (-right[0] - right[1])) == 1
+    if -left[0] - left[1] == -right[0] - right[1]:
+        return abs(left[0] - right[0]) == 1
+    return False
+
+
+class HexSnakeTest(SimpleTestCase):
+    def setUp(self):
+        # Search without tables, unless a test builds them
+        self.table_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.table_dir.cleanup)
+        table_dir_override = override_settings(WIN_TABLE_DIR=self.table_dir.name)
+        table_dir_override.enable()
+        self.addCleanup(table_dir_override.disable)
+        win_table._TABLES.clear()
+        self.addCleanup(win_table._TABLES.clear)
+
+        self.random = random.Random(0)
+        positions = tuple(get_positions(BoardShape.HEXAGON))
+        self.geometry = BoardGeometry(tuple(range(100, 100 + len(positions))), positions)
+
+    def test_search_matches_reference(self):
+        self._check_random_boards()
+
+    def test_table_matches_reference(self):
+        for name, table in build_win_tables().items():
+            win_table.save(name, table)
+        self._check_random_boards()
+
+    def test_incremental_matches_reference(self):
+        self._check_random_marks()
+
+    def test_incremental_table_matches_reference(self):
+        for name, table in build_win_tables().items():
+            win_table.save(name, table)
+        self._check_random_marks()
+
+    def _check_random_boards(self):
+        for _ in range(BOARDS):
+            colors = self._random_colors()
+            for detector, allow_neigh in [(hex_snake, True), (hex_snake_neighborless, False)]:
+                self._assert_matches(detector(self.geometry, colors), colors, allow_neigh)
+
+    def _check_random_marks(self):
+        for detector, allow_neigh in [(hex_snake, True), (hex_snake_neighborless, False)]:
+            colors = self._random_colors()
+            win = detector(self.geometry, colors)
+            for _ in range(MARKS):
+                index = self.random.randrange(len(colors))
+                colors[index] = self.random.choice(list(Color))
+                win = detector.incremental(self.geometry, colors, self.geometry.space_ids[index],
+                                           win)
+                self._assert_matches(win, colors, allow_neigh)
+
+    def _assert_matches(self, win: Optional[Sequence[int]], colors: Sequence[int],
+                        allow_neigh: bool):
+        marked = frozenset(position for position, color in zip(self.geometry.positions, colors)
+                           if color in WINNING_MARKINGS)
+        self.assertEqual(win is not None, _reference_wins(marked, allow_neigh),
+                         f"Wrong win {win} for {sorted(marked)}")
+        if win is None:
+            return
+
+        # Any chain may be found, so check that this one is valid
+        chain = [self.geometry.positions[self.geometry.index[space_id]] for space_id in win]
+        self.assertGreaterEqual(len(chain), WIN_LENGTH)
+        self.assertEqual(len(set(chain)), len(chain))
+        self.assertTrue(set(chain) <= marked)
+        for i in range(1, len(chain)):
+            self.assertTrue(_reference_is_neighbor(chain[i - 1], chain[i]))
+            if not allow_neigh and i >= 2:
+                self.assertFalse(_reference_is_neighbor(chain[i - 2], chain[i]))
+
+    def _random_colors(self):
+        # Vary how much of the board is marked, so that there are both wins and near misses
+        density = self.random.uniform(0.2, 0.6)
+        return [self.random.choice(WINNING_MARKINGS) if self.random.random() < density
+                else self.random.choice([Color.UNMARKED, Color.REVERTED, Color.INVALIDATED])
+                for _ in self.geometry.space_ids]
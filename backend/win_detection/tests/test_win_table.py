@@ -0,0 +1,43 @@
+import random
+
+from django.test import SimpleTestCase
+
+from win_detection import win_table
+
+SPACE_COUNTS = [3, 4, 8, 12]
+TABLES = 20
+
+
+class WinTableTest(SimpleTestCase):
+    def setUp(self):
+        self.random = random.Random(0)
+
+    def test_build_matches_every_mask(self):
+        # Small enough boards that every mask can be checked against every minimal win
+        for space_count in SPACE_COUNTS:
+            for _ in range(TABLES):
+                minimal_wins = self._random_masks(space_count)
+                table = win_table.build(minimal_wins, space_count)
+                self.assertEqual(len(table), 1 << space_count >> 3)
+                for mask in range(1 << space_count):
+                    self.assertEqual(win_table.wins(table, mask),
+                                     any(mask & win == win for win in minimal_wins),
+                                     f"Mask {mask:b} of {space_count} spaces")
+
+    def test_minimal_win(self):
+        for space_count in SPACE_COUNTS:
+            for _ in range(TABLES):
+                table = win_table.build(self._random_masks(space_count), space_count)
+                for mask in range(1 << space_count):
+                    if not win_table.wins(table, mask):
+                        continue
+                    minimal = win_table.minimal_win(table, mask)
+                    self.assertEqual(minimal & ~mask, 0)
+                    self.assertTrue(win_table.wins(table, minimal))
+                    for space in range(space_count):
+                        if minimal >> space & 1:
+                            self.assertFalse(win_table.wins(table, minimal & ~(1 << space)))
+
+    def _random_masks(self, space_count: int):
+        return [self.random.getrandbits(space_count) | 1 << self.random.randrange(space_count)
+                for _ in range(self.random.randrange(1, 4))]
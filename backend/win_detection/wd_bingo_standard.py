@@ -1,44 +1,75 @@
 from __future__ import annotations
 
-from typing import Optional, List, Set, TYPE_CHECKING
+from functools import lru_cache
+from typing import Optional, List, Sequence, Tuple
 
-from win_detection.registry import win_detector
+from win_detection.board_geometry import BoardGeometry
+from win_detection.registry import incremental_win_detector, win_detector
 from win_detection.winning_markings import WINNING_MARKINGS
 
-if TYPE_CHECKING:
-    from backend.models.player_board import PlayerBoard
-    from backend.models.player_board_marking import PlayerBoardMarking
-    from backend.models.space import Space
-
 BOARD_SIZE = 5
 
 
+@lru_cache(maxsize=None)
+def _lines(size: int) -> Tuple[int, ...]:
+    """
+    Get the lines that win on a square board: each row, each column, and both diagonals.
+    :return: A mask of each line, where space (x, y) is bit `y * size + x`.
+    """
+    rows = [sum(1 << (y * size + x) for x in range(size)) for y in range(size)]
+    cols = [sum(1 << (y * size + x) for y in range(size)) for x in range(size)]
+    tlbr = sum(1 << (i * size + i) for i in range(size))
+    trbl = sum(1 << (i * size + size - 1 - i) for i in range(size))
+    return tuple(rows + cols + [tlbr, trbl])
+
+
+@lru_cache(maxsize=1024)
+def _bits(geometry: BoardGeometry) -> Tuple[int, ...]:
+    """
+    :return: The bit of each space of a board (see `_lines`), in order.
+    """
+    return tuple(y * BOARD_SIZE + x for x, y in geometry.positions)
+
+
 @win_detector("Standard Bingo rules", ['square'])
-def bingo_standard(pboard: PlayerBoard, markings: List[PlayerBoardMarking]) -> Optional[List[Space]]:
-    winning_pbms = set()  # type: Set[PlayerBoardMarking]
-
-    # Rows and columns
-    for i in range(BOARD_SIZE):
-        row = list(p for p in markings if p.space.position.y == i)
-        if len(row) > 0 and all(spc.color in WINNING_MARKINGS for spc in row):
-            winning_pbms.update(row)
-
-        col = list(p for p in markings if p.space.position.x == i)
-        if len(col) > 0 and all(spc.color in WINNING_MARKINGS for spc in col):
-            winning_pbms.update(col)
-
-        if len(row) == len(col) == 0:
-            # Out of spaces
-            break
-
-    # Diagonals
-    # Top left - bottom right
-    tlbr = list(p for p in markings if p.space.position.x == p.space.position.y)
-    if len(tlbr) > 0 and all(spc.color in WINNING_MARKINGS for spc in tlbr):
-        winning_pbms.update(tlbr)
-    # Top right - bottom left
-    trbl = list(p for p in markings if p.space.position.x == BOARD_SIZE - 1 - p.space.position.y)
-    if len(trbl) > 0 and all(spc.color in WINNING_MARKINGS for spc in trbl):
-        winning_pbms.update(trbl)
-
-    return [pbm.space for pbm in winning_pbms]
+def bingo_standard(geometry: BoardGeometry, colors: Sequence[int]) -> Optional[List[int]]:
+    marked = _marked(geometry, colors)
+
+    winning = 0
+    for line in _lines(BOARD_SIZE):
+        if marked & line == line:
+            winning |= line
+
+    return _space_ids_in(geometry, winning)
+
+
+@incremental_win_detector(bingo_standard)
+def bingo_standard_incremental(geometry: BoardGeometry, colors: Sequence[int], space_id: int,
+                               previous: Optional[List[int]]) -> Optional[List[int]]:
+    bits = _bits(geometry)
+    marked = _marked(geometry, colors)
+    changed = 1 << bits[geometry.index[space_id]]
+    previous_win = sum(1 << bits[geometry.index[pk]] for pk in previous or ())
+
+    # Only lines through the changed space can have been completed or broken. Since every space of
+    #  the previous win was marked, any other line inside it was complete and still is.
+    winning = 0
+    for line in _lines(BOARD_SIZE):
+        if (marked if line & changed else previous_win) & line == line:
+            winning |= line
+
+    return _space_ids_in(geometry, winning)
+
+
+def _marked(geometry: BoardGeometry, colors: Sequence[int]) -> int:
+    marked = 0
+    for bit, color in zip(_bits(geometry), colors):
+        if color in WINNING_MARKINGS:
+            marked |= 1 << bit
+    return marked
+
+
+def _space_ids_in(geometry: BoardGeometry, mask: int) -> Optional[List[int]]:
+    space_ids = [space_id for space_id, bit in zip(geometry.space_ids, _bits(geometry))
+                 if mask >> bit & 1]
+    return space_ids or None
@@ -1,19 +1,14 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from timeit import default_timer
-from typing import Optional, List, TYPE_CHECKING, Tuple, FrozenSet
+from typing import Dict, Iterator, Optional, List, Sequence, Tuple
 
-from win_detection.registry import win_detector
+from backend.models.board_shape import BoardShape, get_positions
+from win_detection import win_table
+from win_detection.board_geometry import BoardGeometry
+from win_detection.registry import incremental_win_detector, win_detector
 from win_detection.winning_markings import WINNING_MARKINGS
 
-if TYPE_CHECKING:
-    from backend.models.player_board import PlayerBoard
-    from backend.models.player_board_marking import PlayerBoardMarking
-    from backend.models.position import Position
-    from backend.models.space import Space
-
-
 WIN_LENGTH = 6
 DEPTH_LIMIT = 6
 """
@@ -21,51 +16,142 @@ The greatest number of spaces that can be in a chain. This problem is NP-hard, s
 long time if set too high.
 """
 
+# Spaces are searched as bits of an integer, numbered in order of position on the board
+_BITS = {position: bit for bit, position in enumerate(get_positions(BoardShape.HEXAGON))}
+"""Bit number of each (x, y) position on a hexagon board."""
+
+
+def _is_neighbor(left: Tuple[int, int], right: Tuple[int, int]):
+    # Neighbors share one axial coordinate and are 1 apart in the other two
+    dx, dy = right[0] - left[0], right[1] - left[1]
+    return (dx, dy) in [(0, 1), (0, -1), (1, 0), (-1, 0), (1, -1), (-1, 1)]
+
+
+_NEIGHBORS = tuple(
+    sum(1 << other_bit for other, other_bit in _BITS.items() if _is_neighbor(position, other))
+    for position in _BITS
+)
+"""Mask of the neighbors of each bit."""
+
+
+@lru_cache(maxsize=1024)
+def _bits(geometry: BoardGeometry) -> Tuple[int, ...]:
+    """
+    :return: The bit of each space of a board, in order.
+    """
+    return tuple(_BITS[position] for position in geometry.positions)
+
 
 @win_detector("Hexagonal snaking win", ['hexagon'])
-def hex_snake(pboard, markings) -> Optional[List[Space]]:
-    return _hex_snake(pboard, markings, True)
+def hex_snake(geometry: BoardGeometry, colors: Sequence[int]) -> Optional[List[int]]:
+    return _hex_snake(geometry, colors, True)
 
 
 @win_detector("Hexagonal snaking, no neighbor", ['hexagon'])
-def hex_snake_neighborless(pboard, markings) -> Optional[List[Space]]:
-    return _hex_snake(pboard, markings, False)
-
-
-def _hex_snake(pboard: PlayerBoard, markings: List[PlayerBoardMarking],
-               allow_neighbors: bool) -> Optional[List[Space]]:
-    positions = (pbm.space.position for pbm in markings if pbm.color in WINNING_MARKINGS)
-    start_time = default_timer()
-    longest = _longest_chain(tuple(), frozenset(positions), allow_neighbors)
-    end_time = default_timer()
-    # _makes_snake(positions)
-    # print(end_time - start_time)
-    # print(_longest_chain.cache_info())
-    return [pos.space for pos in longest] if len(longest) >= WIN_LENGTH else None
-
-
-@lru_cache(maxsize=10000)
-def _longest_chain(current: Tuple[Position, ...],
-                   candidates: FrozenSet[Position],
-                   allow_neigh: bool):
-    if len(current) == 0:
-        next_node_choices = candidates
-    else:
-        if allow_neigh:
-            next_node_choices = _neighbors(current[-1], candidates)
-        else:
-            next_node_choices = frozenset(n for n in _neighbors(current[-1], candidates)
-                                          if len(current) < 2
-                                          or n not in _neighbors(current[-2], candidates))
+def hex_snake_neighborless(geometry: BoardGeometry, colors: Sequence[int]) -> Optional[List[int]]:
+    return _hex_snake(geometry, colors, False)
+
+
+@incremental_win_detector(hex_snake)
+def hex_snake_incremental(geometry: BoardGeometry, colors: Sequence[int], space_id: int,
+                          previous: Optional[List[int]]) -> Optional[List[int]]:
+    return _hex_snake_incremental(geometry, colors, space_id, previous, True)
+
+
+@incremental_win_detector(hex_snake_neighborless)
+def hex_snake_neighborless_incremental(geometry: BoardGeometry, colors: Sequence[int],
+                                       space_id: int,
+                                       previous: Optional[List[int]]) -> Optional[List[int]]:
+    return _hex_snake_incremental(geometry, colors, space_id, previous, False)
+
+
+def _hex_snake(geometry: BoardGeometry, colors: Sequence[int],
+               allow_neighbors: bool) -> Optional[List[int]]:
+    marked = _marked(geometry, colors)
+    if bin(marked).count('1') < WIN_LENGTH:
+        return None
+    return _chain_in(geometry, marked, allow_neighbors)
+
+
+def _hex_snake_incremental(geometry: BoardGeometry, colors: Sequence[int], space_id: int,
+                           previous: Optional[List[int]],
+                           allow_neighbors: bool) -> Optional[List[int]]:
+    bits = _bits(geometry)
+    marked = _marked(geometry, colors)
+
+    if previous:
+        if not sum(1 << bits[geometry.index[pk]] for pk in previous) & ~marked:
+            # The previous chain is still all marked
+            return previous
+        # The changed space was unmarked and broke the chain, so another one could be anywhere
+        return _chain_in(geometry, marked, allow_neighbors)
+
+    changed = 1 << bits[geometry.index[space_id]]
+    if not changed & marked:
+        # Unmarking a space cannot make a chain
+        return None
+
+    # Any new chain includes the changed space, so it is made of spaces that can be reached from
+    #  that space through a few others
+    reachable = changed
+    for _ in range(WIN_LENGTH - 1):
+        for bit in _bits_of(reachable):
+            reachable |= _NEIGHBORS[bit] & marked
+    return _chain_in(geometry, reachable, allow_neighbors)
+
+
+def _marked(geometry: BoardGeometry, colors: Sequence[int]) -> int:
+    marked = 0
+    for bit, color in zip(_bits(geometry), colors):
+        if color in WINNING_MARKINGS:
+            marked |= 1 << bit
+    return marked
+
+
+def _chain_in(geometry: BoardGeometry, candidates: int,
+              allow_neighbors: bool) -> Optional[List[int]]:
+    table = win_table.load(_table_name(allow_neighbors), len(_BITS))
+    if table is not None:
+        if not win_table.wins(table, candidates):
+            return None
+        # Only the spaces of one chain are left to search through
+        candidates = win_table.minimal_win(table, candidates)
+
+    longest = _longest_chain(candidates, allow_neighbors)
+    if len(longest) < WIN_LENGTH:
+        return None
+    space_ids = dict(zip(_bits(geometry), geometry.space_ids))
+    return [space_ids[bit] for bit in longest]
+
+
+def _longest_chain(candidates: int, allow_neigh: bool) -> Tuple[int, ...]:
+    """
+    Find the longest chain of up to `DEPTH_LIMIT` spaces, each of which is a neighbor of the one
+    before it. Unless `allow_neigh`, each space also may not be a neighbor of the one two before it.
+    :param candidates: Mask of the spaces that can be in the chain.
+    :return: Bit numbers of the spaces in the chain, in order.
+    """
+    longest_chain = ()
+    for bit in _bits_of(candidates):
+        longest_from = _extend_chain((bit,), candidates & ~(1 << bit), allow_neigh)
+        if len(longest_from) > len(longest_chain):
+            longest_chain = longest_from
+        if len(longest_chain) >= DEPTH_LIMIT:
+            break
+    return longest_chain
 
+
+def _extend_chain(current: Tuple[int, ...], candidates: int,
+                  allow_neigh: bool) -> Tuple[int, ...]:
+    """
+    Find the longest chain that starts with `current` and continues through `candidates`.
+    """
     if len(current) >= DEPTH_LIMIT:
         return current
 
     longest_chain = current
-    for neigh in next_node_choices:
-        new_chain = current + (neigh,)
-        new_candidates = frozenset(c for c in candidates if c != neigh)
-        longest_from = _longest_chain(new_chain, new_candidates, allow_neigh)
+    for neigh in _next_choices(current, candidates, allow_neigh):
+        longest_from = _extend_chain(current + (neigh,), candidates & ~(1 << neigh), allow_neigh)
         if len(longest_from) > len(longest_chain):
             longest_chain = longest_from
         if len(longest_chain) >= DEPTH_LIMIT:
@@ -73,22 +159,48 @@ def _longest_chain(current: Tuple[Position, ...],
     return longest_chain
 
 
-def _neighbors(of: Position, candidates: FrozenSet[Position]):
+def _next_choices(current: Tuple[int, ...], candidates: int, allow_neigh: bool) -> Iterator[int]:
+    next_node_choices = _NEIGHBORS[current[-1]] & candidates
+    if not allow_neigh and len(current) >= 2:
+        next_node_choices &= ~_NEIGHBORS[current[-2]]
+    return _bits_of(next_node_choices)
+
+
+def build_win_tables() -> Dict[str, bytes]:
+    """
+    Build the win tables of both detectors (see `win_table`).
+    :return: The tables by name.
+    """
+    return {
+        _table_name(allow_neigh): win_table.build(
+            (mask for bit in range(len(_BITS)) for mask in _chain_masks((bit,), allow_neigh)),
+            len(_BITS)
+        )
+        for allow_neigh in [True, False]
+    }
+
+
+def _table_name(allow_neigh: bool) -> str:
+    # Tables are only valid for the win length they were built with
+    detector = hex_snake if allow_neigh else hex_snake_neighborless
+    return f'{detector.__name__}_{WIN_LENGTH}'
+
+
+def _chain_masks(current: Tuple[int, ...], allow_neigh: bool) -> Iterator[int]:
     """
-    Get a list of neighbors to a specific hexagon that occur in `candidates`.
+    Find every chain of `WIN_LENGTH` spaces that starts with `current`.
+    :return: The mask of each chain.
     """
-    ret = set()
-    for other in candidates:
-        if _is_neighbor(of, other):
-            ret.add(other)
-    return frozenset(ret)
-
-
-def _is_neighbor(left: Position, right: Position):
-    if left.x == right.x:
-        return abs(left.y - right.y) == 1
-    if left.y == right.y:
-        return abs(left.z() - right.z()) == 1
-    if left.z() == right.z():
-        return abs(left.x - right.x) == 1
-    return False
+    if len(current) >= WIN_LENGTH:
+        yield sum(1 << bit for bit in current)
+        return
+
+    for neigh in _next_choices(current, ~sum(1 << bit for bit in current), allow_neigh):
+        yield from _chain_masks(current + (neigh,), allow_neigh)
+
+
+def _bits_of(mask: int) -> Iterator[int]:
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
@@ -1,14 +1,14 @@
 from __future__ import annotations
 
-from typing import List, Optional, TYPE_CHECKING
+from typing import List, Optional, Sequence, TYPE_CHECKING
 
+from win_detection.board_geometry import BoardGeometry
 from win_detection.registry import WIN_DETECTORS
 from backend.models.board_shape import BoardShape
 from backend.models.player_board_marking import PlayerBoardMarking
 
 if TYPE_CHECKING:
     from backend.models.player_board import PlayerBoard
-    from backend.models.space import Space
 
 # Import all win detectors
 # noinspection PyUnresolvedReferences
@@ -32,21 +32,54 @@ def get_default_win_detector(shape: BoardShape):
         return None
 
 
-def winning_space_ids(pboard: PlayerBoard) -> Optional[List[int]]:
+def winning_space_ids(pboard: PlayerBoard,
+                      markings: List[PlayerBoardMarking] = None) -> Optional[List[int]]:
+    """
+    Get the IDs of the spaces that make up a player's win, or None if they have not won.
+    :param markings: The player's markings, if already loaded. If None, they are taken from the
+                     player board, which only queries if they are neither packed nor prefetched.
+    """
     detector_func = get_win_detector(pboard.board.win_detector)
 
     if not detector_func:
         return None
 
     try:
-        markings = list(PlayerBoardMarking.objects
-                        .filter(player_board=pboard)
-                        .select_related('space__position', 'space__board'))
-        win_markings = detector_func(pboard, markings)  # type: List[Space]
+        geometry = pboard.board.geometry()
+        return detector_func(geometry, _colors(pboard, geometry, markings))
     except Exception as e:
-        win_markings = []
         print(e)
-    if win_markings:
-        return [space.pk for space in win_markings]
-    else:
         return None
+
+
+def updated_winning_space_ids(pboard: PlayerBoard, markings: List[PlayerBoardMarking],
+                              space_id: int, previous: Optional[List[int]]) -> Optional[List[int]]:
+    """
+    Same as `winning_space_ids`, after one space of a player's board has changed, for when the
+    player's win before the change is known. Only checks the wins that could include that space if
+    the win detector supports it.
+    :param space_id: ID of the space that changed.
+    :param previous: Return value of `winning_space_ids` before the space changed.
+    """
+    detector_func = get_win_detector(pboard.board.win_detector)
+
+    if not detector_func:
+        return None
+    if not detector_func.incremental:
+        return winning_space_ids(pboard, markings)
+
+    try:
+        geometry = pboard.board.geometry()
+        return detector_func.incremental(geometry, _colors(pboard, geometry, markings), space_id,
+                                         previous)
+    except Exception as e:
+        print(e)
+        return None
+
+
+def _colors(pboard: PlayerBoard, geometry: BoardGeometry,
+            markings: Optional[List[PlayerBoardMarking]]) -> Sequence[int]:
+    if markings is None:
+        return pboard.get_colors()
+    colors = {marking.space_id: marking.color for marking in markings}
+    return [colors[space_id] for space_id in geometry.space_ids]
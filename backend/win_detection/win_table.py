@@ -0,0 +1,105 @@
+"""
+Tables of which sets of marked spaces win, for boards with few enough spaces that every set can be
+listed. A table has one bit for every mask of marked spaces, which is set if the mask wins, so a
+board of 24 spaces has a 2 MB table.
+
+Tables are built by the `buildwintables` command and memory-mapped, so that every server process
+shares one copy. Detectors should search for wins themselves while their table has not been built.
+"""
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+
+_TABLES = {}  # type: Dict[str, Optional[mmap.mmap]]
+
+
+def build(minimal_wins: Iterable[int], space_count: int) -> bytes:
+    """
+    Build a table.
+    :param minimal_wins: Masks of the smallest sets of spaces that win. Since marking more spaces
+                         cannot undo a win, a set of spaces wins if it contains any of these.
+    :param space_count: Number of spaces on the board, which must be at least 3.
+    """
+    table = bytearray(1 << space_count >> 3)
+    for mask in minimal_wins:
+        table[mask >> 3] |= 1 << (mask & 7)
+
+    # Add every superset one space at a time, since a mask with a space wins if it does without it.
+    #  Operates on the whole table as one integer, which is far faster than looping over its bits.
+    wins = int.from_bytes(table, 'little')
+    for space in range(space_count):
+        wins |= (wins & _masks_without(space, space_count)) << (1 << space)
+    return wins.to_bytes(len(table), 'little')
+
+
+def _masks_without(space: int, space_count: int) -> int:
+    """
+    :return: A table with the bit of every mask that does not include `space` set.
+    """
+    if space < 3:
+        pattern = bytes([(0x55, 0x33, 0x0f)[space]])
+    else:
+        half = 1 << space >> 3
+        pattern = b'\xff' * half + b'\x00' * half
+    return int.from_bytes(pattern * ((1 << space_count >> 3) // len(pattern)), 'little')
+
+
+def save(name: str, table: bytes):
+    path = _path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Replace rather than overwrite the file, so that processes that have mapped it are not affected
+    temp_path = path.with_suffix('.tmp')
+    temp_path.write_bytes(table)
+    os.replace(temp_path, path)
+
+
+def load(name: str, space_count: int) -> Optional[mmap.mmap]:
+    """
+    Get a table that has been built, mapping it into memory the first time.
+    :return: The table, or None if it has not been built.
+    """
+    if name not in _TABLES:
+        _TABLES[name] = _map(name, space_count)
+    return _TABLES[name]
+
+
+def _map(name: str, space_count: int) -> Optional[mmap.mmap]:
+    path = _path(name)
+    try:
+        with open(path, 'rb') as fp:
+            table = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        print(f"Win table {name} has not been built, so wins will be searched for instead. "
+              f"Run the buildwintables command to build it.")
+        return None
+
+    if len(table) != 1 << space_count >> 3:
+        print(f"Win table {name} is for a different board and will not be used. "
+              f"Run the buildwintables command to rebuild it.")
+        table.close()
+        return None
+    return table
+
+
+def _path(name: str) -> Path:
+    return Path(settings.WIN_TABLE_DIR) / f'{name}.bin'
+
+
+def wins(table: mmap.mmap, mask: int) -> bool:
+    return bool(table[mask >> 3] >> (mask & 7) & 1)
+
+
+def minimal_win(table: mmap.mmap, mask: int) -> int:
+    """
+    :param mask: A mask of spaces that wins.
+    :return: A smallest subset of `mask` that still wins.
+    """
+    # Since a space that is needed to win stays needed as others are removed, one pass is enough
+    for space in range(mask.bit_length()):
+        without = mask & ~(1 << space)
+        if without != mask and wins(table, without):
+            mask = without
+    return mask
@@ -4,18 +4,29 @@ import { WebSocketLike } from "react-use-websocket/dist/lib/types"
 
 import { IBingoGameState } from "./components/game/BingoGame"
 import { TBoard } from "./interface/IBoard"
-import { IPlayerBoardMarking, TPlayerBoard } from "./interface/IPlayerBoard"
+import { IPlayerBoardMarking, IPlayerBoardPatch, TPlayerBoard, TPlayerBoardPatch } from "./interface/IPlayerBoard"
 
 type SetState = React.Dispatch<React.SetStateAction<IBingoGameState>>
 
 let socket: WebSocket | null = null
 
+/* Version of the player boards last received. Kept outside of the state so that messages can be
+ * checked against it without side effects in state updaters, which React may call more than once */
+let version: number | undefined = undefined
+
+/* Whether a `sync_pboards` has been sent and not yet answered, so that it is only sent once */
+let syncRequested = false
+
 export const updateWebSocket = (ws: WebSocketLike | null) => {
   if (!(ws instanceof WebSocket)) {
     console.error("Got a WebSocketLike that is not an instance of a WebSocket: ")
     console.error(ws)
     return
   }
+  if (ws !== socket) {
+    // A sync requested on the old socket will never be answered
+    syncRequested = false
+  }
   socket = ws
 }
 
@@ -26,6 +37,15 @@ export const onApiMessage = (setState: SetState, message: any) => {
     return
   }
 
+  if (message.hasOwnProperty("hello")) {
+    // Everything a player needs when joining, in one message
+    const board = TBoard.parse(message["hello"]["board"])
+    const pbs = z.array(TPlayerBoard).parse(message["hello"]["pboards"])
+    const snapshotVersion = z.number().parse(message["hello"]["version"])
+    onSnapshot(snapshotVersion)
+    setState(state => ({...state, board: board, playerBoards: pbs, version: snapshotVersion}))
+  }
+
   if (message.hasOwnProperty("board")) {
     const board = TBoard.parse(message["board"])
     setState(state => ({...state, board: board}))
@@ -33,7 +53,29 @@ export const onApiMessage = (setState: SetState, message: any) => {
 
   if (message.hasOwnProperty("pboards")) {
     const pbs = z.array(TPlayerBoard).parse(message["pboards"])
-    setState(state => ({...state, playerBoards: pbs}))
+    const snapshotVersion = z.number().parse(message["version"])
+    onSnapshot(snapshotVersion)
+    setState(state => ({...state, playerBoards: pbs, version: snapshotVersion}))
+  }
+
+  if (message.hasOwnProperty("pboard_patch")) {
+    const patch = TPlayerBoardPatch.parse(message["pboard_patch"])
+    if (version === undefined || patch.version <= version) {
+      // Already included in the last full update
+    } else if (patch.version > version + 1) {
+      // Missed a patch - ask for everything again
+      requestSync()
+    } else {
+      version = patch.version
+      setState(state => applyPatch(state, patch))
+    }
+  }
+
+  if (message.hasOwnProperty("pong")) {
+    const pongVersion = z.number().nullable().parse(message["pong"]["version"])
+    if (pongVersion !== null && version !== undefined && pongVersion > version) {
+      requestSync()
+    }
   }
 
   if (message.hasOwnProperty("message")) {
@@ -44,13 +86,49 @@ export const onApiMessage = (setState: SetState, message: any) => {
   }
 }
 
-export const getWebSocketUrl = (gameCode: string, playerName?: string) => {
+const onSnapshot = (snapshotVersion: number) => {
+  version = snapshotVersion
+  syncRequested = false
+}
+
+const requestSync = () => {
+  if (syncRequested) {
+    // The answer will include everything that was missed since
+    return
+  }
+  syncRequested = true
+  sendSyncPlayerBoards()
+}
+
+/* Must only be given patches that directly follow the state's version (see `onApiMessage`) */
+const applyPatch = (state: IBingoGameState, patch: IPlayerBoardPatch): IBingoGameState => {
+  const playerBoards = state.playerBoards.map(pb => {
+    if (pb.player_id !== patch.player_id) {
+      return pb
+    }
+    const markings = pb.markings.map(m => m.space_id !== patch.space_id ? m : {
+      ...m,
+      color: patch.color,
+      covert_marked: patch.covert_marked,
+      marked_by_player: patch.marked_by_player,
+    })
+    return {...pb, markings: markings, win: patch.win}
+  })
+  return {...state, playerBoards: playerBoards, version: patch.version}
+}
+
+/**
+ * @param resumeVersion The last board version received, if reconnecting. The server then only sends
+ *                      what changed since.
+ */
+export const getWebSocketUrl = (gameCode: string, playerName?: string, resumeVersion?: number) => {
   const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws'
   const portStr = (process.env.NODE_ENV === "development" ? ":8000" :
     (window.location.port ? ":" + window.location.port : ""))
   return protocol + '://' + window.location.hostname + portStr
       + '/ws/board/'
       + encodeURI(gameCode) + encodeURI(playerName ? ('/' + playerName) : '')
+      + (resumeVersion !== undefined ? '?version=' + resumeVersion : '')
 }
 
 export const sendMarkBoard = (marking: Partial<IPlayerBoardMarking> & Pick<IPlayerBoardMarking, 'space_id'>) => {
@@ -68,6 +146,18 @@ export const sendRevealBoard = () => {
   })
 }
 
+export const sendPing = () => {
+  send({
+    action: "ping",
+  })
+}
+
+export const sendSyncPlayerBoards = () => {
+  send({
+    action: "sync_pboards",
+  })
+}
+
 const send = (obj: object) => {
   if (socket && socket.readyState === WebSocket.OPEN) {
     socket.send(JSON.stringify(obj))
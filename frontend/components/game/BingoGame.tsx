@@ -2,7 +2,7 @@ import React from 'react'
 import { useMediaQuery } from "react-responsive"
 import useWebSocket, { ReadyState } from "react-use-websocket"
 
-import { getWebSocketUrl, onApiMessage, updateWebSocket } from "api"
+import { getWebSocketUrl, onApiMessage, sendPing, updateWebSocket } from "api"
 
 import { BoardShape, IBoard } from "interface/IBoard"
 import { IGameMessage } from "interface/IGameMessage"
@@ -17,6 +17,8 @@ import { TapModeSelector } from "./TapModeSelector"
 
 import styles from "styles/Game.module.scss"
 
+const PING_INTERVAL_MS = 30000
+
 type IProps = {
   gameCode: string
   playerName?: string
@@ -25,6 +27,7 @@ type IProps = {
 export type IBingoGameState = {
   board?: IBoard
   playerBoards: IPlayerBoard[]
+  version?: number
   messages: IGameMessage[]
   connecting: boolean
   tapToMark: boolean
@@ -46,7 +49,12 @@ export const BingoGame: React.FunctionComponent<IProps> = (props: IProps) => {
     }
   })()
 
-  const socketUrl = React.useCallback(() => getWebSocketUrl(props.gameCode, props.playerName),
+  /* Resume from the last version seen when reconnecting */
+  const versionRef = React.useRef<number | undefined>(undefined)
+  versionRef.current = state.version
+
+  const socketUrl = React.useCallback(
+    () => getWebSocketUrl(props.gameCode, props.playerName, versionRef.current),
     [props.gameCode, props.playerName])
   const {
     lastJsonMessage,
@@ -63,6 +71,15 @@ export const BingoGame: React.FunctionComponent<IProps> = (props: IProps) => {
     updateWebSocket(getWebSocket())
   }, [getWebSocket, readyState])
 
+  /* Regularly check that no updates were missed */
+  React.useEffect(() => {
+    if (readyState !== ReadyState.OPEN) {
+      return
+    }
+    const interval = setInterval(sendPing, PING_INTERVAL_MS)
+    return () => clearInterval(interval)
+  }, [readyState])
+
   /* React to incoming messages */
   React.useEffect(() => {
     onApiMessage(setState, lastJsonMessage)
@@ -111,6 +128,7 @@ const getInitialState = (isTapOnly: boolean): IBingoGameState => {
     board: undefined,
     connecting: true,
     playerBoards: [],
+    version: undefined,
     messages: [],
     tapToMark: !isTapOnly,
   }
@@ -26,3 +26,15 @@ export const TPlayerBoard = z.object({
 })
 
 export type IPlayerBoard = Infer<typeof TPlayerBoard>;
+
+export const TPlayerBoardPatch = z.object({
+  version: z.number(),
+  player_id: z.number(),
+  space_id: z.number(),
+  color: z.enum(Color),
+  covert_marked: z.boolean(),
+  marked_by_player: z.boolean(),
+  win: z.array(z.number()).nullable(),
+})
+
+export type IPlayerBoardPatch = Infer<typeof TPlayerBoardPatch>;